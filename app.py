@@ -1,4 +1,12 @@
 from dash import Dash
 from dash_bootstrap_components.themes import BOOTSTRAP
+from src.components.layout import create_layout
+from src import metrics
 
-app = Dash(external_stylesheets=[BOOTSTRAP], use_pages=True)
\ No newline at end of file
+app = Dash(__name__, external_stylesheets=[BOOTSTRAP], use_pages=True, suppress_callback_exceptions=True)
+app.title = "Wikipedia Wars"
+app.layout = create_layout()
+
+# WSGI entry point, e.g. `gunicorn --workers 4 app:server`
+server = app.server
+metrics.register(server)
\ No newline at end of file
@@ -0,0 +1,78 @@
+# Loading article histories from a stub-meta-history dump against crawling them
+# through the API. A synthetic dump holds all but the newest --tail-share of
+# every history served by the local API stand-in. It is ingested into a fresh
+# store, then the tail is synced from the stand-in. The result is checked
+# against the full histories and timed against a crawl from an empty store.
+#
+#   python -m benchmarks.dump_ingest [--articles 20] [--revisions 20000] [--compression gz] [--latency 0.05]
+import argparse
+import bz2
+import gzip
+import os
+import tempfile
+import time
+from benchmarks import mock_api, synthetic
+from src import api_client, config, dump_ingest, helpers, store
+
+OPENERS = {"gz": gzip.open, "bz2": bz2.open, "xml": open}
+
+def write_dump(path, histories, titles, tail_share, compression):
+    dumped = {}
+    for title in titles:
+        rows = histories.get("revisions", title)[0]
+        dumped[title] = rows[:len(rows) - int(len(rows) * tail_share)]
+    with OPENERS[compression](path, "wb") as stream:
+        synthetic.write_stub_dump(stream, dumped)
+    return sum(map(len, dumped.values()))
+
+def stored_revisions(titles):
+    with store.connect() as conn:
+        return conn.execute(
+            f"SELECT COUNT(*) FROM revisions WHERE page IN ({', '.join('?' * len(titles))})", titles,
+        ).fetchone()[0]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=20)
+    parser.add_argument("--revisions", type=int, default=20000, help="rows per synthetic article history")
+    parser.add_argument("--tail-share", type=float, default=0.02, help="share of each history made after the dump")
+    parser.add_argument("--compression", choices=list(OPENERS), default="gz")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the stand-in adds to every response")
+    args = parser.parse_args()
+
+    histories = mock_api.Histories(revisions=args.revisions)
+    server, config.API_URL = mock_api.serve_in_thread(histories, port=0, latency=args.latency)
+    titles = [f"Dump article {i}" for i in range(args.articles)]
+    total = args.articles * args.revisions
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"stub-meta-history.xml.{args.compression}")
+        dumped = write_dump(path, histories, titles, args.tail_share, args.compression)
+        print(f"Dump of {dumped} revisions, {os.path.getsize(path) / 2**20:.1f} MB {args.compression}")
+
+        config.STORE_PATH = os.path.join(directory, "dump.sqlite3")
+        with dump_ingest.open_dump(path) as stream:
+            stats = dump_ingest.ingest(stream)
+        served = server.requests_served
+        started = time.perf_counter()
+        dump_ingest.sync_tails(titles)
+        tail_seconds = time.perf_counter() - started
+        assert stored_revisions(titles) == total, "the dump and its tail do not add up to the full histories"
+        dump_seconds = stats["seconds"] + tail_seconds
+        dump_requests = server.requests_served - served
+
+        config.STORE_PATH = os.path.join(directory, "crawl.sqlite3")
+        served = server.requests_served
+        started = time.perf_counter()
+        api_client.fetch_many(lambda title: helpers.ensure_revisions(title, None), titles)
+        crawl_seconds = time.perf_counter() - started
+        assert stored_revisions(titles) == total
+        crawl_requests = server.requests_served - served
+
+    print(f"{'source':<14} {'seconds':>9} {'rows/s':>10} {'API requests':>13}")
+    print(f"{'dump':<14} {stats['seconds']:>9.2f} {stats['parsed'] / stats['seconds']:>10,.0f} {0:>13}")
+    print(f"{'dump + tail':<14} {dump_seconds:>9.2f} {total / dump_seconds:>10,.0f} {dump_requests:>13}")
+    print(f"{'API crawl':<14} {crawl_seconds:>9.2f} {total / crawl_seconds:>10,.0f} {crawl_requests:>13}")
+
+if __name__ == "__main__":
+    main()
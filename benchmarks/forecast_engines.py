@@ -0,0 +1,62 @@
+# Compares forecast engines on the revision histories recorded in the local
+# store: each engine is fitted on all but the last 12 complete months and
+# scored against them.
+#
+#   python -m benchmarks.forecast_engines [--engines prophet,numpy] [--limit 50]
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src import forecast, store
+
+def recorded_histories(limit):
+    with store.connect() as conn:
+        pages = [row[0] for row in conn.execute("SELECT DISTINCT page FROM revisions LIMIT ?", (limit,))]
+    for page in pages:
+        revisions = store.load_revisions(page)
+        yield page, forecast.monthly_counts(pd.to_datetime(revisions["timestamp"]))
+
+def evaluate(engine, df_forecast, holdout):
+    train, test = df_forecast.iloc[:-holdout], df_forecast.iloc[-holdout:]
+    future = pd.DatetimeIndex(test["ds"])
+
+    start = time.perf_counter()
+    _, predictions = forecast.ENGINES[engine](train, future)
+    elapsed = time.perf_counter() - start
+
+    actual = test["y"].to_numpy(dtype=float)
+    yhat = predictions[:, 0]
+    mae = np.abs(actual - yhat).mean()
+    smape = np.mean(2 * np.abs(actual - yhat) / np.maximum(np.abs(actual) + np.abs(yhat), 1e-9))
+    coverage = np.mean((actual >= predictions[:, 1]) & (actual <= predictions[:, 2]))
+    return elapsed, mae, smape, coverage
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--engines", default=",".join(forecast.ENGINES))
+    parser.add_argument("--limit", type=int, default=50, help="maximum number of stored articles to use")
+    parser.add_argument("--holdout", type=int, default=forecast.FORECAST_PERIODS, help="months held out for scoring")
+    args = parser.parse_args()
+
+    engines = args.engines.split(",")
+    results = {engine: [] for engine in engines}
+    for page, df_forecast in recorded_histories(args.limit):
+        df_forecast = df_forecast[df_forecast["ds"] <= forecast.last_complete_month()]
+        if len(df_forecast) < args.holdout + 3:
+            continue
+        for engine in engines:
+            results[engine].append(evaluate(engine, df_forecast, args.holdout))
+
+    print(f"{'engine':<10} {'articles':>8} {'fit ms (median)':>16} {'MAE':>10} {'sMAPE':>8} {'coverage':>9}")
+    for engine, rows in results.items():
+        if not rows:
+            print(f"{engine:<10} no recorded histories with enough months, open some articles first")
+            continue
+        rows = np.array(rows)
+        print(
+            f"{engine:<10} {len(rows):>8} {np.median(rows[:, 0]) * 1000:>16.1f} "
+            f"{rows[:, 1].mean():>10.2f} {rows[:, 2].mean():>8.3f} {rows[:, 3].mean():>9.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
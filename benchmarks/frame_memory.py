@@ -0,0 +1,48 @@
+# Memory of the revision frame the details pages work on, built the old way
+# (list of dicts -> object columns -> to_datetime) and the typed way (column
+# arrays built per API page).
+#
+#   python -m benchmarks.frame_memory [--rows 100000]
+import argparse
+import time
+import tracemalloc
+import pandas as pd
+from benchmarks import synthetic
+from src import frames
+
+def dict_list_frame(pages):
+    all_revisions = []
+    for page in pages:
+        all_revisions.extend(page)
+    df = pd.DataFrame(all_revisions)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+def typed_frame(pages):
+    return frames.build_frame([frames.page_columns(page, frames.REVISION_DTYPES) for page in pages], frames.REVISION_DTYPES)
+
+def measure(build, revisions):
+    start = time.perf_counter()
+    build(synthetic.api_pages(revisions))
+    elapsed = time.perf_counter() - start
+
+    # Timed separately, tracemalloc slows allocation-heavy code down a lot
+    tracemalloc.start()
+    df = build(synthetic.api_pages(revisions))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df.memory_usage(deep=True).sum(), peak, elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    revisions = synthetic.revision_history(args.rows)
+    print(f"{'frame':<10} {'frame MB':>9} {'peak MB':>8} {'build s':>8}")
+    for name, build in [("dict list", dict_list_frame), ("typed", typed_frame)]:
+        size, peak, elapsed = measure(build, revisions)
+        print(f"{name:<10} {size / 2**20:>9.2f} {peak / 2**20:>8.2f} {elapsed:>8.3f}")
+
+if __name__ == "__main__":
+    main()
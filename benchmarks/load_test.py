@@ -0,0 +1,203 @@
+# Throughput of the app under many concurrent sessions. For each worker count
+# the app is served by gunicorn on a fresh store, against the local API
+# stand-in, and every simulated session repeatedly compares an article on the
+# dashboard (update_matrics), opens an article page and opens a contributor
+# page (both on_page_load handlers) through Dash's callback endpoint.
+#
+#   python -m benchmarks.load_test [--workers 1,2,4] [--sessions 32] [--iterations 5] [--latency 0.05]
+#
+# The first visit to an article or user starts its background sync, later
+# visits are answered from the store. With the local stand-in, the API requests
+# it served during each run are printed too; identical fetches from concurrent
+# sessions are coalesced, so that number should stay flat as sessions grow.
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from benchmarks import mock_api
+from src.constants import ids
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CALLBACK_PATH = "/_dash-update-component"
+
+def callback_body(outputs, inputs, state, changed):
+    # The request the Dash renderer sends for a callback, outputs and inputs
+    # as (id, property[, value]) tuples
+    output_ids = [f"{id_}.{prop}" for id_, prop in outputs]
+    return {
+        "output": output_ids[0] if len(outputs) == 1 else ".." + "...".join(output_ids) + "..",
+        "outputs": [{"id": id_, "property": prop} for id_, prop in outputs] if len(outputs) > 1 else {"id": outputs[0][0], "property": outputs[0][1]},
+        "inputs": [item if isinstance(item, list) else {"id": item[0], "property": item[1], "value": item[2]} for item in inputs],
+        "state": [{"id": id_, "property": prop, "value": value} for id_, prop, value in state],
+        "changedPropIds": changed,
+    }
+
+def compare_article(article, compared_articles):
+    return callback_body(
+        [(ids.DASHBOARD_CONTENT, "children"), (ids.COMPARISON_STORE, "data"), (ids.SEARCH_ERROR_MESSAGE, "children"),
+         (ids.COMPARISON_REVIDS, "data")],
+        [(ids.SEARCH_BUTTON, "n_clicks", 1), []],
+        [(ids.SEARCH_INPUT, "value", article), (ids.COMPARISON_STORE, "data", compared_articles)],
+        [f"{ids.SEARCH_BUTTON}.n_clicks"],
+    )
+
+def open_page(container, window, pathname):
+    # Details pages are opened on their whole history, without a time window
+    return callback_body(
+        [(container, "children")],
+        [("layout-container", "children", None)],
+        [("url", "pathname", pathname), (window, "start_date", None), (window, "end_date", None)],
+        ["layout-container.children"],
+    )
+
+class Session:
+    # One simulated browser tab; the compared articles travel with it like the
+    # session-storage dcc.Store does
+    def __init__(self, base_url, articles, users, seed):
+        self.base_url = base_url
+        self.articles = articles
+        self.users = users
+        self.random = random.Random(seed)
+        self.http = requests.Session()
+        self.compared_articles = []
+
+    def call(self, name, body, timings):
+        start = time.perf_counter()
+        try:
+            response = self.http.post(self.base_url + CALLBACK_PATH, json=body, timeout=300)
+            ok = response.status_code in (200, 204)
+        except requests.RequestException:
+            response, ok = None, False
+        timings.append((name, time.perf_counter() - start, ok))
+        return response.json() if ok and response.status_code == 200 else None
+
+    def visit(self, timings):
+        article = self.random.choice(self.articles)
+        data = self.call("update_matrics", compare_article(article, self.compared_articles), timings)
+        if data is not None and ids.COMPARISON_STORE in data["response"]:
+            self.compared_articles = data["response"][ids.COMPARISON_STORE]["data"]
+
+        article = self.random.choice(self.articles)
+        self.call("article on_page_load", open_page(ids.ARTICLE_DETAILS_CONTAINER, ids.ARTICLE_WINDOW, f"/details/{article.replace(' ', '_')}"), timings)
+
+        user = self.random.choice(self.users)
+        self.call("contributor on_page_load", open_page(ids.CONTRIBUTOR_DETAILS_CONTAINER, ids.CONTRIBUTOR_WINDOW, f"/contributor/{user.replace(' ', '_')}"), timings)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_app(workers, api_url, store_path, engine):
+    port = free_port()
+    env = {
+        **os.environ,
+        "EDIT_WARS_API_URL": api_url,
+        "EDIT_WARS_STORE_PATH": store_path,
+        "EDIT_WARS_FORECAST_ENGINE": engine,
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--bind", f"127.0.0.1:{port}",
+         "--timeout", "300", "--log-level", "warning", "app:server"],
+        cwd=ROOT, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode}")
+        try:
+            requests.get(base_url + "/_dash-layout", timeout=5).raise_for_status()
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+def run(workers, args, api_url):
+    articles = [f"Load test article {i}" for i in range(args.articles)]
+    users = [f"User {i}" for i in range(args.users)]
+    with tempfile.TemporaryDirectory() as directory:
+        process, base_url = start_app(workers, api_url, os.path.join(directory, "load.sqlite3"), args.engine)
+        try:
+            timings = []
+            lock = threading.Lock()
+
+            def session(seed):
+                session_timings = []
+                simulated = Session(base_url, articles, users, seed)
+                for _ in range(args.iterations):
+                    simulated.visit(session_timings)
+                with lock:
+                    timings.extend(session_timings)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+                list(pool.map(session, range(args.sessions)))
+            elapsed = time.perf_counter() - start
+        finally:
+            process.terminate()
+            process.wait()
+    return timings, elapsed
+
+def report(workers, timings, elapsed):
+    names = ["all"] + list(dict.fromkeys(name for name, _, _ in timings))
+    for name in names:
+        selected = [(seconds, ok) for callback, seconds, ok in timings if name in ("all", callback)]
+        latencies = np.array([seconds for seconds, _ in selected]) * 1000
+        errors = sum(not ok for _, ok in selected)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(
+            f"{workers:>7} {name:<26} {len(selected):>8} {errors:>6} {len(selected) / elapsed:>8.1f} "
+            f"{p50:>9.1f} {p95:>9.1f} {p99:>9.1f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="comma separated gunicorn worker counts")
+    parser.add_argument("--sessions", type=int, default=32, help="concurrent simulated sessions")
+    parser.add_argument("--iterations", type=int, default=5, help="visits per session")
+    parser.add_argument("--articles", type=int, default=20)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--engine", default="numpy", help="forecast engine the app runs with")
+    parser.add_argument("--api-url", help="use this API instead of starting the local stand-in")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the stand-in adds to every response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stand-in responses that are 503s")
+    parser.add_argument("--maxlag-rate", type=float, default=0.0, help="share of stand-in responses that are maxlag errors")
+    parser.add_argument("--fixtures", help="recorded histories for the stand-in to replay")
+    parser.add_argument("--revisions", type=int, default=5000, help="rows per synthetic article history")
+    parser.add_argument("--contributions", type=int, default=2000, help="rows per synthetic contribution history")
+    args = parser.parse_args()
+
+    api_url, server = args.api_url, None
+    if api_url is None:
+        fixtures = None
+        if args.fixtures:
+            with open(args.fixtures) as f:
+                fixtures = json.load(f)
+        histories = mock_api.Histories(fixtures, args.revisions, args.contributions)
+        server, api_url = mock_api.serve_in_thread(
+            histories, port=0, latency=args.latency, jitter=args.jitter,
+            error_rate=args.error_rate, maxlag_rate=args.maxlag_rate,
+        )
+
+    print(f"{'workers':>7} {'callback':<26} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for workers in map(int, args.workers.split(",")):
+        served = server.requests_served if server else 0
+        timings, elapsed = run(workers, args, api_url)
+        report(workers, timings, elapsed)
+        if server:
+            print(f"{workers:>7} upstream API requests: {server.requests_served - served}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# Local stand-in for the MediaWiki API the app queries: page info, revisions,
+# user contributions, category members and recent changes, paged with
+# rvcontinue/uccontinue like the real API. Histories are replayed from a
+# recorded fixture file, or generated for any title or user asked for; every
+# synthetic category holds CATEGORY_SIZE articles.
+#
+# With --live-rate, new edits are made to the articles fetched so far. They
+# show up in list=recentchanges and on an EventStreams-style server-sent event
+# stream at STREAM_PATH.
+#
+#   python -m benchmarks.mock_api [--port 8765] [--latency 0.05] [--fixtures recorded.json]
+#                                 [--error-rate 0.05] [--maxlag-rate 0.05] [--live-rate 2]
+#   EDIT_WARS_API_URL=http://127.0.0.1:8765/w/api.php python main.py
+#
+# Fixtures are recorded from the configured API with
+#
+#   python -m benchmarks.mock_api record --titles "Earth|Moon" --users "Some user" --out recorded.json
+import argparse
+import bisect
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from benchmarks import synthetic
+
+API_PATH = "/w/api.php"
+STREAM_PATH = "/v2/stream/recentchange"
+MAX_LIMIT = 500
+CATEGORY_SIZE = 120
+
+class Histories:
+    # Revisions per title and contributions per user, oldest first
+    def __init__(self, fixtures=None, revisions=5000, contributions=2000):
+        self.fixtures = fixtures
+        self.sizes = {"revisions": revisions, "usercontribs": contributions}
+        self._histories = {}
+        self._lock = threading.Lock()
+        # Recent changes, oldest first, and the streams waiting for new ones
+        self.changes = []
+        self.changed = threading.Condition(self._lock)
+
+    def get(self, kind, key):
+        with self._lock:
+            if (kind, key) not in self._histories:
+                self._histories[kind, key] = self._load(kind, key)
+            return self._histories[kind, key]
+
+    def _load(self, kind, key):
+        if self.fixtures is not None:
+            rows = self.fixtures.get(kind, {}).get(key)
+            if not rows:
+                return None
+            rows = sorted(rows, key=lambda row: row["revid"])
+        elif kind == "revisions":
+            rows = synthetic.revision_history(self.sizes[kind], seed=zlib.crc32(key.encode()))
+        else:
+            rows = synthetic.contribution_history(self.sizes[kind], seed=zlib.crc32(key.encode()))
+        # Sorted keys for bisecting rvstart and continuation tokens
+        return rows, [row["timestamp"] for row in rows], [row["revid"] for row in rows]
+
+    def edit(self, title, user):
+        # Appends a revision to a history already loaded and records the change
+        with self._lock:
+            history = self._histories.get(("revisions", title))
+            if not history:
+                return None
+            rows, timestamps, revids = history
+            parent = rows[-1]
+            now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            revision = {
+                "revid": parent["revid"] + 3, "parentid": parent["revid"], "user": user,
+                "timestamp": max(now, parent["timestamp"]),
+                "sha1": f"{random.getrandbits(160):040x}", "size": parent.get("size", 0) + random.randint(-200, 400),
+            }
+            rows.append(revision)
+            timestamps.append(revision["timestamp"])
+            revids.append(revision["revid"])
+            change = {
+                "type": "edit", "ns": 0, "title": title, "pageid": zlib.crc32(title.encode()),
+                "revid": revision["revid"], "old_revid": parent["revid"], "rcid": len(self.changes) + 1,
+                "user": user, "timestamp": revision["timestamp"], "sha1": revision["sha1"],
+                "oldlen": parent.get("size", 0), "newlen": revision["size"],
+            }
+            self.changes.append(change)
+            self.changed.notify_all()
+            return change
+
+    def loaded_titles(self):
+        with self._lock:
+            return [key for (kind, key), history in self._histories.items() if kind == "revisions" and history]
+
+def make_edits(histories, rate, users=20):
+    # Edits a random article already loaded, rate times a second on average
+    while True:
+        time.sleep(random.expovariate(rate))
+        titles = histories.loaded_titles()
+        if titles:
+            histories.edit(random.choice(titles), f"User {random.randrange(users)}")
+
+def recent_changes(histories, params):
+    # Changes from rcstart on, oldest first, continued by rcid
+    limit = params.get("rclimit", "max")
+    limit = MAX_LIMIT if limit == "max" else min(int(limit), MAX_LIMIT)
+    with histories.changed:
+        changes = list(histories.changes)
+    low = bisect.bisect_left([change["timestamp"] for change in changes], params.get("rcstart", ""))
+    if "rccontinue" in params:
+        low = max(low, int(params["rccontinue"].split("|")[-1]) - 1)
+    page = changes[low:low + limit]
+    if low + limit < len(changes):
+        following = changes[low + limit]
+        return page, {"rccontinue": f"{following['timestamp']}|{following['rcid']}", "continue": "-||"}
+    return page, None
+
+def stream_event(change):
+    # The EventStreams recentchange schema, which has no content hash
+    seconds = datetime.strptime(change["timestamp"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp()
+    return {
+        "meta": {"id": str(change["rcid"]), "dt": change["timestamp"], "domain": "en.wikipedia.org"},
+        "id": change["rcid"], "type": change["type"], "namespace": change["ns"], "title": change["title"],
+        "timestamp": int(seconds), "user": change["user"], "wiki": "enwiki",
+        "length": {"old": change["oldlen"], "new": change["newlen"]},
+        "revision": {"old": change["old_revid"], "new": change["revid"]},
+    }
+
+def continue_token(row):
+    return f"{row['timestamp'].replace('-', '').replace(':', '').replace('T', '').rstrip('Z')}|{row['revid']}"
+
+def list_page(history, params, prefix):
+    # One page of a history in the order, start, end and limit the query asks
+    # for, with the token that continues after it
+    rows, timestamps, revids = history
+    limit = params.get(f"{prefix}limit", "max")
+    limit = MAX_LIMIT if limit == "max" else min(int(limit), MAX_LIMIT)
+    start = params.get(f"{prefix}start")
+    end = params.get(f"{prefix}end")
+    resume = params.get(f"{prefix}continue")
+
+    if params.get(f"{prefix}dir") == "newer":
+        low = bisect.bisect_left(timestamps, start) if start else 0
+        stop = bisect.bisect_right(timestamps, end) if end else len(rows)
+        if resume:
+            low = max(low, bisect.bisect_left(revids, int(resume.split("|")[-1])))
+        page = rows[low:min(low + limit, stop)]
+        following = rows[low + limit] if low + limit < stop else None
+    else:
+        high = bisect.bisect_right(timestamps, start) if start else len(rows)
+        stop = bisect.bisect_left(timestamps, end) if end else 0
+        if resume:
+            high = min(high, bisect.bisect_right(revids, int(resume.split("|")[-1])))
+        page = rows[max(high - limit, stop):high][::-1]
+        following = rows[high - limit - 1] if high - limit > stop else None
+
+    if following is None:
+        return page, None
+    return page, {f"{prefix}continue": continue_token(following), "continue": "||" if prefix == "rv" else "-||"}
+
+def query(histories, params):
+    if params.get("list") == "usercontribs":
+        history = histories.get("usercontribs", params["ucuser"])
+        contribs, resume = list_page(history, params, "uc") if history else ([], None)
+        response = {"query": {"usercontribs": contribs}}
+    elif params.get("list") == "recentchanges":
+        changes, resume = recent_changes(histories, params)
+        response = {"query": {"recentchanges": changes}}
+    elif params.get("list") == "categorymembers":
+        limit = params.get("cmlimit", "max")
+        limit = MAX_LIMIT if limit == "max" else min(int(limit), MAX_LIMIT)
+        offset = int(params.get("cmcontinue", "0"))
+        name = params["cmtitle"].split(":", 1)[-1]
+        members = [
+            {"pageid": index + 1, "ns": 0, "title": f"{name} article {index}"}
+            for index in range(offset, min(offset + limit, CATEGORY_SIZE))
+        ]
+        response = {"query": {"categorymembers": members}}
+        resume = {"cmcontinue": str(offset + limit), "continue": "-||"} if offset + limit < CATEGORY_SIZE else None
+    elif params.get("prop") == "info":
+        pages = []
+        for title in params["titles"].split("|"):
+            history = histories.get("revisions", title)
+            pages.append({"title": title, "lastrevid": history[0][-1]["revid"]} if history else {"title": title, "missing": True})
+        response = {"query": {"pages": pages}}
+        resume = None
+    elif params.get("prop") == "revisions":
+        title = params["titles"]
+        history = histories.get("revisions", title)
+        if history is None:
+            return {"batchcomplete": True, "query": {"pages": [{"title": title, "missing": True}]}}
+        revisions, resume = list_page(history, params, "rv")
+        response = {"query": {"pages": [{"title": title, "revisions": revisions}]}}
+    else:
+        return {"error": {"code": "badvalue", "info": f"Unsupported query: {params}"}}
+
+    if resume:
+        response["continue"] = resume
+    else:
+        response["batchcomplete"] = True
+    return response
+
+def make_server(histories, host="127.0.0.1", port=8765, latency=0.0, jitter=0.0, error_rate=0.0, maxlag_rate=0.0):
+    # error_rate and maxlag_rate answer that share of requests with a 503 or a
+    # maxlag error, to exercise the client's retries
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == STREAM_PATH:
+                self.stream(int(self.headers.get("Last-Event-ID") or 0))
+                return
+            if url.path != API_PATH:
+                self.send_error(404)
+                return
+            with lock:
+                server.requests_served += 1
+            time.sleep(latency + random.uniform(0, jitter))
+            chance = random.random()
+            if chance < error_rate:
+                self.send_error(503)
+                return
+            if chance < error_rate + maxlag_rate:
+                response = {"error": {"code": "maxlag", "info": "Waiting for a database server: 6 seconds lagged."}}
+                self.reply(response, {"Retry-After": "1"})
+                return
+            self.reply(query(histories, dict(parse_qsl(url.query))))
+
+        def stream(self, after):
+            # Server-sent events for every change after the given rcid, until
+            # the client disconnects
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                while True:
+                    with histories.changed:
+                        histories.changed.wait_for(lambda: len(histories.changes) > after, timeout=15)
+                        changes = histories.changes[after:]
+                    if not changes:
+                        # Comments keep idle connections open
+                        self.wfile.write(b":\n\n")
+                    for change in changes:
+                        event = json.dumps(stream_event(change))
+                        self.wfile.write(f"event: message\nid: {change['rcid']}\ndata: {event}\n\n".encode())
+                    self.wfile.flush()
+                    after += len(changes)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def reply(self, response, headers=None):
+            body = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    lock = threading.Lock()
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.requests_served = 0
+    return server
+
+def serve_in_thread(histories, **kwargs):
+    server = make_server(histories, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}{API_PATH}"
+
+def record(titles, users, out):
+    from src import api_client, helpers
+
+    fixtures = {"revisions": {}, "usercontribs": {}}
+    for title in titles:
+        params = {"prop": "revisions", "titles": title, "rvprop": api_client.REVISION_PROPS, "rvlimit": "max", "rvdir": "newer"}
+        for data in api_client.iter_query(params):
+            fixtures["revisions"].setdefault(title, []).extend(data["query"]["pages"][0].get("revisions", []))
+    for user in users:
+        params = {"list": "usercontribs", "ucuser": user, "uclimit": "max", "ucprop": api_client.CONTRIBUTION_PROPS, "ucdir": "newer"}
+        for data in api_client.iter_query(params):
+            fixtures["usercontribs"].setdefault(user, []).extend(data["query"]["usercontribs"])
+
+    with open(out, "w") as f:
+        json.dump(fixtures, f)
+    print(f"Recorded {len(fixtures['revisions'])} articles and {len(fixtures['usercontribs'])} users from {helpers.API_URL} to {out}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", nargs="?", choices=["serve", "record"], default="serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many seconds added on top, at random")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--maxlag-rate", type=float, default=0.0, help="share of requests answered with a maxlag error")
+    parser.add_argument("--live-rate", type=float, default=0.0, help="new edits per second to the articles fetched so far")
+    parser.add_argument("--fixtures", help="recorded histories to replay instead of synthetic ones")
+    parser.add_argument("--revisions", type=int, default=5000, help="rows per synthetic article history")
+    parser.add_argument("--contributions", type=int, default=2000, help="rows per synthetic contribution history")
+    parser.add_argument("--titles", default="", help="'|' separated articles to record")
+    parser.add_argument("--users", default="", help="'|' separated users to record")
+    parser.add_argument("--out", default="recorded.json")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record([t for t in args.titles.split("|") if t], [u for u in args.users.split("|") if u], args.out)
+        return
+
+    fixtures = None
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            fixtures = json.load(f)
+    histories = Histories(fixtures, args.revisions, args.contributions)
+    server = make_server(histories, args.host, args.port, args.latency, args.jitter, args.error_rate, args.maxlag_rate)
+    if args.live_rate:
+        threading.Thread(target=make_edits, args=(histories, args.live_rate), daemon=True).start()
+    print(f"Serving the MediaWiki API stand-in on http://{args.host}:{args.port}{API_PATH}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
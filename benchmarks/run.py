@@ -0,0 +1,223 @@
+# Times every stage between an API response and a rendered details page on
+# synthetic histories of each size, in a throwaway store:
+#
+#   json        json.loads of the API response pages
+#   frame       typed column chunks per page, then the DataFrame
+#   ingest      saving each page to the store and its aggregate index, or for
+#               contributions counting it into the index
+#   load        the full article history frame read back from the store
+#   stats       get_article_stats, as used by the dashboard
+#   page        the aggregates the details pages' on_page_load renders from
+#   forecast    one fit per engine on the monthly counts
+#   edit wars   revert and mutual revert detection over the stored hashes
+#   figure      building the details page and serializing it to JSON, with
+#               the size of the JSON sent to the browser
+#   zoom        the timeline re-queried for a one year window
+#
+# Wall time and peak memory are measured in separate passes. Results can be
+# saved as a baseline, later runs are compared against it and exit with 1 when
+# a stage got slower or bigger by more than the threshold.
+#
+#   python -m benchmarks.run [--sizes 1000,10000,100000] [--save-baseline] [--compare]
+#   python -m benchmarks.run --sizes 1000000,5000000 --no-memory
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from dash._utils import to_json
+from benchmarks import synthetic
+from src import aggregates, config, edit_wars, forecast, frames, helpers, store, timeline
+from src.cache import revision_cache
+
+DEFAULT_SIZES = "1000,10000,100000"
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+ARTICLE = "Benchmark article"
+CONTRIBUTOR = "Benchmark user"
+# Stages faster than this are too noisy to flag
+MIN_SECONDS = 0.005
+MIN_PEAK_MB = 1.0
+MIN_PAYLOAD_KB = 1.0
+
+class StageTimer:
+    # Accumulates wall time, or peak memory above what was allocated when the
+    # stage started, over every call of each stage
+    def __init__(self, memory, repeat):
+        self.memory = memory
+        self.repeat = repeat
+        self.results = {}
+
+    def run(self, stage, fn, *args):
+        result = self.results.setdefault(stage, {"seconds": 0.0, "peak_mb": 0.0, "payload_kb": 0.0})
+        if self.memory:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            value = fn(*args)
+            _, peak = tracemalloc.get_traced_memory()
+            result["peak_mb"] = max(result["peak_mb"], (peak - current) / 2**20)
+        else:
+            start = time.perf_counter()
+            value = fn(*args)
+            result["seconds"] += time.perf_counter() - start
+        return value
+
+    def best(self, stage, fn, *args):
+        # Single-shot stages keep their fastest run, the first one pays for
+        # imports and warm-up
+        runs = []
+        for _ in range(1 if self.memory else self.repeat):
+            self.results.pop(stage, None)
+            value = self.run(stage, fn, *args)
+            runs.append(self.results[stage])
+        self.results[stage] = min(runs, key=lambda result: result["seconds"])
+        return value
+
+def ingest(timer, kind, key, pages, dtypes, save, load):
+    chunks = []
+    for page in pages:
+        # Serialized outside the timers, the client only ever sees the bytes
+        body = json.dumps({"query": {kind: page}})
+        rows = timer.run(f"{kind} json", json.loads, body)["query"][kind]
+        if dtypes:
+            chunks.append(timer.run(f"{kind} frame", frames.page_columns, rows, dtypes))
+        timer.run(f"{kind} ingest", save, key, rows)
+    if dtypes:
+        timer.run(f"{kind} frame", frames.build_frame, chunks, dtypes)
+    if load:
+        timer.run(f"{kind} load", load, key)
+
+def count_contributions(username, contribs):
+    # One page of a contribution sync, which only keeps the counts
+    counts = aggregates.ContributionCounts(username, store.get_sync_state("contributions", username))
+    counts.add(contribs)
+    counts.flush()
+
+def uncached(fn):
+    # Every repeat starts cold, like the first request after a sync
+    def run(*args):
+        revision_cache.clear()
+        return fn(*args)
+    return run
+
+def run_size(size, timer, engines):
+    from pages import article_details, contributor_details
+
+    ingest(timer, "revisions", ARTICLE, synthetic.revision_pages(size), frames.REVISION_DTYPES,
+           store.save_revisions, store.load_revisions)
+    ingest(timer, "usercontribs", CONTRIBUTOR, synthetic.contribution_pages(size), None,
+           count_contributions, None)
+
+    article_revid = store.get_sync_state("revisions", ARTICLE)[1]
+    contributor_revid = store.get_sync_state("contributions", CONTRIBUTOR)[1]
+    timer.best("stats", uncached(helpers.get_article_stats), ARTICLE, article_revid)
+    article = timer.best("article page", uncached(helpers.get_article_aggregates), ARTICLE, article_revid)
+    contributor = timer.best("contributor page", uncached(helpers.get_contributor_aggregates), CONTRIBUTOR, contributor_revid)
+
+    month = forecast.last_complete_month()
+    monthly = article["monthly"][article["monthly"]["ds"] <= month]
+    for engine in engines:
+        timer.best(f"forecast {engine}", forecast.ENGINES[engine], monthly, forecast.future_months(month))
+
+    # Detected from the stored history every run, not read back from the saved result
+    wars = timer.best("edit wars", lambda key: edit_wars.detect(store.load_revert_history(key)), ARTICLE)
+
+    forecast_result = forecast.compute_forecast(ARTICLE, article_revid, month, monthly, engine="numpy")
+    payloads = {
+        "article figure": timer.best("article figure", lambda: to_json(article_details.build_article_view(
+            ARTICLE, article, article_details.render_forecast_figure(forecast_result),
+            article_details.render_edit_wars_section(wars),
+        ))),
+        "contributor figure": timer.best("contributor figure", lambda: to_json(
+            contributor_details.build_contributor_view(CONTRIBUTOR, contributor),
+        )),
+    }
+
+    end = article["latest_rev_timestamp"].tz_localize(None)
+    payloads["article zoom"] = timer.best("article zoom", lambda: to_json(article_details.render_timeline_figure(
+        timeline.load_window("revisions", ARTICLE, end - pd.DateOffset(years=1), end),
+    )))
+    for stage, payload in payloads.items():
+        timer.results[stage]["payload_kb"] = len(payload) / 1024
+
+def measure(size, engines, memory, repeat):
+    timer = StageTimer(memory, repeat)
+    with tempfile.TemporaryDirectory() as directory:
+        config.STORE_PATH = os.path.join(directory, "benchmark.sqlite3")
+        if memory:
+            tracemalloc.start()
+        try:
+            run_size(size, timer, engines)
+        finally:
+            if memory:
+                tracemalloc.stop()
+    return timer.results
+
+def regressions(results, baseline, threshold):
+    flagged = []
+    for size, stages in results.items():
+        for stage, result in stages.items():
+            before = baseline.get(size, {}).get(stage)
+            if before is None:
+                continue
+            for metric, floor in [("seconds", MIN_SECONDS), ("peak_mb", MIN_PEAK_MB), ("payload_kb", MIN_PAYLOAD_KB)]:
+                if result[metric] > max(before.get(metric, 0.0), floor) * threshold:
+                    flagged.append((size, stage, metric, before.get(metric, 0.0), result[metric]))
+    return flagged
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma separated history sizes in rows")
+    parser.add_argument("--engines", default=",".join(forecast.ENGINES))
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each single-shot stage, the fastest is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory pass")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="flag regressions against the saved baseline")
+    parser.add_argument("--threshold", type=float, default=1.3, help="ratio to the baseline that counts as a regression")
+    args = parser.parse_args()
+
+    # Importing the app registers the pages whose views are benchmarked
+    import app  # noqa: F401
+
+    engines = [
+        engine for engine in args.engines.split(",")
+        if engine != "prophet" or importlib.util.find_spec("prophet") is not None
+    ]
+    results = {}
+    print(f"{'rows':>9} {'stage':<22} {'seconds':>9} {'peak MB':>9} {'payload KB':>11}")
+    for size in map(int, args.sizes.split(",")):
+        stages = measure(size, engines, memory=False, repeat=args.repeat)
+        if not args.no_memory:
+            for stage, result in measure(size, engines, memory=True, repeat=args.repeat).items():
+                stages[stage]["peak_mb"] = result["peak_mb"]
+        for stage, result in stages.items():
+            print(f"{size:>9} {stage:<22} {result['seconds']:>9.3f} {result['peak_mb']:>9.2f} {result['payload_kb']:>11.1f}")
+        results[str(size)] = stages
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    exit_code = 0
+    if args.compare:
+        flagged = regressions(results, baseline, args.threshold)
+        for size, stage, metric, before, after in flagged:
+            print(f"REGRESSION {size} rows, {stage}: {metric} {before:.3f} -> {after:.3f}")
+        if not flagged:
+            print("No regressions against the baseline")
+        exit_code = 1 if flagged else 0
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Cold start of the app, each run in a fresh interpreter: importing app.py
+# (which imports every page), and the first figure a worker builds, with and
+# without the prewarm that runs after a gunicorn fork.
+#
+#   python -m benchmarks.startup [--runs 5] [--importtime]
+import argparse
+import os
+import subprocess
+import sys
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+prewarm = 0.0
+if {prewarm}:
+    from src import prewarm as warm
+    started = time.perf_counter()
+    warm.prewarm()
+    prewarm = time.perf_counter() - started
+import pandas as pd
+from dash._utils import to_json
+from pages import article_details
+started = time.perf_counter()
+to_json(article_details.render_timeline_figure(pd.DataFrame({{"timestamp": pd.date_range("2020-01-01", periods=30).date, "count": range(30)}})))
+print(imported, prewarm, time.perf_counter() - started)
+"""
+
+def probe(prewarm):
+    # The forecast pool stays inline so prewarming doesn't spawn processes
+    env = {**os.environ, "EDIT_WARS_FORECAST_ENGINE": "numpy"}
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(prewarm=prewarm)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return [float(value) for value in output.split()[-3:]]
+
+def import_profile(top):
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stderr
+    # Children are listed before their parent, indented two more spaces
+    rows = []
+    for line in stderr.splitlines()[1:]:
+        _, cumulative, module = line.split("|")
+        depth = (len(module) - len(module.lstrip())) // 2
+        if depth == 0:
+            if module.strip() == "app":
+                break
+            rows = []
+        elif depth == 1:
+            rows.append((int(cumulative), module.strip()))
+    # The direct imports of app.py, including everything they import
+    for cumulative, module in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1000:>9.1f} ms  {module}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports of app.py")
+    args = parser.parse_args()
+
+    print(f"{'prewarm':<8} {'import app s':>13} {'prewarm s':>10} {'first figure s':>15}")
+    for prewarm in (False, True):
+        runs = np.array([probe(prewarm) for _ in range(args.runs)])
+        imported, warmed, first_figure = np.median(runs, axis=0)
+        print(f"{'yes' if prewarm else 'no':<8} {imported:>13.3f} {warmed:>10.3f} {first_figure:>15.3f}")
+
+    if args.importtime:
+        print()
+        import_profile(15)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Synthetic MediaWiki histories shaped like real API responses, generated one
+# API page at a time so multi-million row histories fit in memory
+import itertools
+from xml.sax.saxutils import escape
+import numpy as np
+import pandas as pd
+
+API_PAGE_SIZE = 500
+SPAN_SECONDS = 20 * 365 * 86400
+# Share of revisions that restore one of the few versions before them
+REVERT_SHARE = 0.08
+
+def _pages(n, seed, start, page_size, make_rows):
+    rng = np.random.default_rng(seed)
+    seconds = pd.Timestamp(start, tz="UTC").value // 10**9
+    revid = 1000
+    for offset in range(0, n, page_size):
+        size = min(page_size, n - offset)
+        gaps = rng.exponential(scale=max(1, SPAN_SECONDS // n), size=size).astype(np.int64) + 1
+        page_seconds = seconds + np.cumsum(gaps)
+        seconds = int(page_seconds[-1])
+        timestamps = np.datetime_as_string(page_seconds.astype("datetime64[s]"), unit="s")
+        revids = revid + np.arange(size) * 3
+        revid = int(revids[-1]) + 3
+        yield make_rows(rng, size, revids.tolist(), [f"{timestamp}Z" for timestamp in timestamps])
+
+def revision_pages(n, users=None, start="2005-01-01", seed=0, page_size=API_PAGE_SIZE):
+    users = users or max(10, n // 20)
+
+    def make_rows(rng, size, revids, timestamps):
+        # Heavy-tailed editor activity, like real articles
+        user_ids = (np.minimum(rng.zipf(1.5, size), users) - 1).tolist()
+        # Every revision has new content, except reverts, which copy the hash
+        # and size of an earlier revision on the same page of results
+        contents = np.array(revids, dtype=np.uint64)
+        sizes = 20000 + np.cumsum(rng.integers(-200, 400, size))
+        for position in np.flatnonzero(rng.random(size) < REVERT_SHARE):
+            restored = position - 1 - rng.integers(1, 4)
+            if restored >= 0:
+                contents[position], sizes[position] = contents[restored], sizes[restored]
+        # A multiplicative hash spreads the ids over the leading hex digits
+        mixed = contents * np.uint64(0x9E3779B97F4A7C15)
+        return [
+            {
+                "revid": revid, "parentid": revid - 3, "user": f"User {user_id}", "timestamp": timestamp,
+                "sha1": f"{hashed:016x}{content:024x}", "size": size,
+            }
+            for revid, user_id, timestamp, hashed, content, size
+            in zip(revids, user_ids, timestamps, mixed.tolist(), contents.tolist(), sizes.tolist())
+        ]
+
+    return _pages(n, seed, start, page_size, make_rows)
+
+def contribution_pages(n, articles=None, start="2005-01-01", seed=0, page_size=API_PAGE_SIZE):
+    articles = articles or max(10, n // 10)
+
+    def make_rows(rng, size, revids, timestamps):
+        article_ids = (np.minimum(rng.zipf(1.3, size), articles) - 1).tolist()
+        return [
+            {"revid": revid, "parentid": revid - 3, "pageid": article_id + 1, "title": f"Article {article_id}", "timestamp": timestamp}
+            for revid, article_id, timestamp in zip(revids, article_ids, timestamps)
+        ]
+
+    return _pages(n, seed, start, page_size, make_rows)
+
+def revision_history(n, **kwargs):
+    return list(itertools.chain.from_iterable(revision_pages(n, **kwargs)))
+
+def contribution_history(n, **kwargs):
+    return list(itertools.chain.from_iterable(contribution_pages(n, **kwargs)))
+
+def api_pages(revisions, page_size=API_PAGE_SIZE):
+    for start in range(0, len(revisions), page_size):
+        yield revisions[start:start + page_size]
+
+def _base36(value):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    encoded = ""
+    while value:
+        value, digit = divmod(value, 36)
+        encoded = digits[digit] + encoded
+    return encoded.rjust(31, "0")
+
+def write_stub_dump(stream, histories):
+    # A stub-meta-history dump of {title: revisions} as the API returns them,
+    # written to a binary stream. Dumps carry sha1 in base 36.
+    stream.write(b'<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/" version="0.11" xml:lang="en">\n')
+    stream.write(b"  <siteinfo>\n    <sitename>Wikipedia</sitename>\n  </siteinfo>\n")
+    for pageid, (title, revisions) in enumerate(histories.items(), start=1):
+        lines = [f"  <page>\n    <title>{escape(title)}</title>\n    <ns>0</ns>\n    <id>{pageid}</id>\n"]
+        for rev in revisions:
+            lines.append(
+                f"    <revision>\n      <id>{rev['revid']}</id>\n      <parentid>{rev['parentid']}</parentid>\n"
+                f"      <timestamp>{rev['timestamp']}</timestamp>\n"
+                f"      <contributor>\n        <username>{escape(rev['user'])}</username>\n        <id>1</id>\n      </contributor>\n"
+                f"      <model>wikitext</model>\n      <format>text/x-wiki</format>\n"
+                f"      <text bytes=\"{rev['size']}\" sha1=\"{_base36(int(rev['sha1'], 16))}\" location=\"tt:{rev['revid']}\" id=\"{rev['revid']}\" />\n"
+                f"      <sha1>{_base36(int(rev['sha1'], 16))}</sha1>\n    </revision>\n"
+            )
+        lines.append("  </page>\n")
+        stream.write("".join(lines).encode())
+    stream.write(b"</mediawiki>\n")
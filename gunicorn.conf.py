@@ -0,0 +1,12 @@
+# Read by `gunicorn app:server` when started from the repository root. Module
+# level names are gunicorn settings, so the app's modules are imported in the
+# hooks.
+
+def post_fork(server, worker):
+    from src import config
+
+    # Each worker warms up in the background, it starts accepting requests
+    # right away either way
+    if config.PREWARM:
+        from src import prewarm
+        prewarm.start()
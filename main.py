@@ -1,9 +1,11 @@
-from dash import Dash
-from dash_bootstrap_components.themes import BOOTSTRAP
-from src.components.layout import create_layout
-
 if __name__ == "__main__":
-    app = Dash(external_stylesheets=[BOOTSTRAP], use_pages=True)
-    app.title = "Wikipedia Wars"
-    app.layout = create_layout()
-    app.run()
\ No newline at end of file
+    from app import app
+    from src import config
+
+    if config.PREWARM:
+        from src import prewarm
+        prewarm.start()
+    if config.LIVE_FEED:
+        from src import live_updates
+        live_updates.start()
+    app.run()
@@ -1,106 +1,312 @@
-from dash import register_page, html, dcc, callback, Output, Input, State
+from dash import register_page, html, dcc, callback, Output, Input, State, no_update
 import pandas as pd
-import plotly.express as px
 import dash_bootstrap_components as dbc
-from prophet import Prophet
-from src.helpers import fetch_all_revisions, format_timestamp_readable
-import io
-import base64
-from datetime import datetime
+from src.helpers import format_timestamp_readable, get_last_revid, get_article_aggregates, get_edit_wars, get_revision_window, is_synced, time_window
+from src.aggregates import article_aggregates, article_window_aggregates
+from src.store import page_key
 import time
 from src.constants import ids
+from src import config, edit_wars, forecast, metrics, prefetch, store, sync_jobs, timeline
 
 register_page(__name__, path_template="/details/<article_name>")
 
-def get_top_10_contributors(df):
-    top_contributors = df["user"].value_counts().sort_values(ascending=False)
-    return top_contributors.head(10)
+# Plotly is imported where figures are built: every page is imported at
+# startup, and most workers restart long before they render a chart.
 
-def add_activity_timeline(df):
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-    df["hour"] = df["timestamp"].dt.hour
-    df["day"] = df["timestamp"].dt.day
+def render_forecast_figure(forecast_result):
+    import plotly.graph_objects as go
 
+    forecast_fig = go.Figure([
+        go.Scatter(
+            x=forecast_result["ds"] + forecast_result["ds"][::-1],
+            y=forecast_result["yhat_upper"] + forecast_result["yhat_lower"][::-1],
+            fill="toself",
+            fillcolor="rgba(0, 114, 178, 0.2)",
+            line={"width": 0},
+            hoverinfo="skip",
+            name="Uncertainty",
+        ),
+        go.Scatter(x=forecast_result["history"]["ds"], y=forecast_result["history"]["y"], mode="markers", name="Actual", marker={"color": "black"}),
+        go.Scatter(x=forecast_result["ds"], y=forecast_result["yhat"], mode="lines", name="Forecast", line={"color": "#0072B2"}),
+    ])
+    forecast_fig.update_layout(xaxis_title="Date", yaxis_title="Number of Edits")
+    return dcc.Graph(figure=forecast_fig, style={"width": "100%"})
+
+def render_timeline_figure(daily_count):
+    import plotly.express as px
+
+    timeline_fig = px.line(
+        timeline.downsample(daily_count),
+        x = "timestamp",
+        y = "count",
+        labels = { "count": "Total Edits", "timestamp": "Time" },
+    )
+    # Keeps the user's zoom when the zoomed-in range is sent back
+    timeline_fig.update_layout(uirevision="timeline")
+    return timeline_fig
 
 @callback(
     Output(ids.ARTICLE_DETAILS_CONTAINER, "children"),
     Input("layout-container", "children"),
     State("url", "pathname"),
+    State(ids.ARTICLE_WINDOW, "start_date"),
+    State(ids.ARTICLE_WINDOW, "end_date"),
     on_page_load=False
 )
-def on_page_load(_, pathname):
+def on_page_load(_, pathname, start_date, end_date):
+    started = time.monotonic()
     article_name = pathname.split("/")[-1]
-    df_rev = fetch_all_revisions(article_name)
-    if(df_rev is None or df_rev.empty):
+    article_key = page_key(article_name)
+    last_revid = get_last_revid(article_key)
+    sync_job = {"name": article_name, "article": article_key, "revid": last_revid, "window": time_window(start_date, end_date)}
+
+    content, job = render_content(sync_job)
+    if job is None:
+        sync_jobs.record_first_paint(time.monotonic() - started)
+
+    return html.Div([
+        html.Div(id=ids.ARTICLE_SYNC_CONTENT, children=content),
+        dcc.Interval(id=ids.ARTICLE_SYNC_INTERVAL, interval=config.SYNC_POLL_INTERVAL_MS, disabled=job is None),
+        dcc.Interval(id=ids.ARTICLE_LIVE_INTERVAL, interval=config.LIVE_REFRESH_INTERVAL_MS or 1, disabled=not config.LIVE_REFRESH_INTERVAL_MS),
+        dcc.Store(id=ids.ARTICLE_SYNC_JOB, data=sync_job),
+    ])
+
+def render_content(sync_job):
+    # Histories that still need fetching are loaded by a background job and
+    # the page shows what is stored so far until it finishes. A time window
+    # is rendered straight away, from the store or fetched on its own.
+    article_name, article_key, last_revid = sync_job["name"], sync_job["article"], sync_job["revid"]
+    if sync_job["window"]:
+        return render_article_window(article_name, article_key, last_revid, *sync_job["window"]), None
+    if last_revid is not None and not is_synced("revisions", article_key, last_revid):
+        job = sync_jobs.start("revisions", article_key, last_revid)
+        return render_partial_article(article_name, article_key, job), job
+    return render_article(article_name, article_key, last_revid), None
+
+@callback(
+    Output(ids.ARTICLE_SYNC_CONTENT, "children", allow_duplicate=True),
+    Output(ids.ARTICLE_SYNC_INTERVAL, "disabled", allow_duplicate=True),
+    Output(ids.ARTICLE_SYNC_JOB, "data", allow_duplicate=True),
+    Input(ids.ARTICLE_WINDOW, "start_date"),
+    Input(ids.ARTICLE_WINDOW, "end_date"),
+    State(ids.ARTICLE_SYNC_JOB, "data"),
+    prevent_initial_call=True,
+)
+def on_window_change(start_date, end_date, sync_job):
+    if sync_job is None:
+        # The page is still loading and picks the window up itself
+        return no_update, no_update, no_update
+    sync_job = {**sync_job, "window": time_window(start_date, end_date)}
+    content, job = render_content(sync_job)
+    return content, job is None, sync_job
+
+@callback(
+    Output(ids.ARTICLE_SYNC_CONTENT, "children"),
+    Output(ids.ARTICLE_SYNC_INTERVAL, "disabled"),
+    Input(ids.ARTICLE_SYNC_INTERVAL, "n_intervals"),
+    State(ids.ARTICLE_SYNC_JOB, "data"),
+    prevent_initial_call=True,
+)
+def on_sync_progress(_, sync_job):
+    if sync_job["window"]:
+        return no_update, True
+    article_name, article_key, last_revid = sync_job["name"], sync_job["article"], sync_job["revid"]
+    job = sync_jobs.get("revisions", article_key)
+    if job is None and not is_synced("revisions", article_key, last_revid):
+        # The fetch was started by another worker process, continue it here
+        job = sync_jobs.start("revisions", article_key, last_revid)
+
+    if job is None or (job.done() and job.error is None):
+        return render_article(article_name, article_key, last_revid), True
+    # A failed fetch leaves what it stored so far, shown with the error
+    # instead of fetching again while the page polls
+    return render_partial_article(article_name, article_key, job), job.done()
+
+@callback(
+    Output(ids.ARTICLE_SYNC_CONTENT, "children", allow_duplicate=True),
+    Output(ids.ARTICLE_SYNC_JOB, "data", allow_duplicate=True),
+    Input(ids.ARTICLE_LIVE_INTERVAL, "n_intervals"),
+    State(ids.ARTICLE_SYNC_JOB, "data"),
+    State(ids.ARTICLE_SYNC_INTERVAL, "disabled"),
+    prevent_initial_call=True,
+)
+def on_live_update(_, sync_job, synced):
+    # New edits applied to the store since the page was rendered, by the
+    # recent changes follower or another page load, are shown without a reload
+    if not synced:
+        return no_update, no_update
+    sync_state = store.get_sync_state("revisions", sync_job["article"])
+    if sync_state is None or sync_state[1] == sync_job["revid"]:
+        return no_update, no_update
+    sync_job = {**sync_job, "revid": sync_state[1]}
+    return render_content(sync_job)[0], sync_job
+
+def render_partial_article(article_name, article_key, job):
+    aggregates = article_aggregates(article_key)
+    failed = html.P(
+        f"Fetching the revision history failed, reload the page to retry: {job.error}",
+        style={"textAlign": "center", "color": "red"},
+    )
+    if aggregates is None:
+        return html.Div([
+            html.H1(f"{article_name}", style={"textAlign": "center"}),
+            failed if job.error else html.P("Fetching revision history...", style={"textAlign": "center"}),
+            None if job.error else dbc.Progress(value=100, striped=True, animated=True),
+        ])
+
+    job.record_first_paint()
+    first_edit = pd.Timestamp(aggregates["daily_count"]["timestamp"].iloc[0])
+    progress = sync_jobs.progress(first_edit, aggregates["latest_rev_timestamp"])
+    loaded = f"{aggregates['total_edits']} revisions loaded, up to {format_timestamp_readable(aggregates['latest_rev_timestamp'])}"
+    return html.Div([
+        dbc.Progress(value=progress, label=f"{progress}%", striped=not job.error, animated=not job.error, style={"marginBottom": "5px"}),
+        html.P(loaded, style={"textAlign": "center"}),
+        failed if job.error else None,
+        build_article_view(
+            article_name, aggregates,
+            html.P("The forecast is computed once the full history is loaded.", style={"textAlign": "center"}),
+            html.P("Edit wars are detected once the full history is loaded.", style={"textAlign": "center"}),
+        ),
+    ])
+
+def render_article(article_name, article_key, last_revid):
+    aggregates = get_article_aggregates(article_key, last_revid)
+    if aggregates is None:
         return html.Div([
             html.H1(f"Article Details: {article_name}", style={'textAlign': 'center', 'marginBottom': '20px'}),
             html.P("No data available for this article.", style={'textAlign': 'center', 'color': 'red'})
         ])
 
-    total_contributors = df_rev["user"].nunique()
-    latest_rev_timestamp = df_rev["timestamp"].max()
-    total_edits = df_rev.shape[0]
+    # The top contributors are linked, fetch them before they are clicked
+    prefetch.queue("contributor", aggregates["top_contributors"].index)
+    return build_article_view(
+        article_name, aggregates,
+        render_forecast_section(article_key, last_revid, aggregates),
+        render_edit_wars_section(get_edit_wars(article_key, last_revid)),
+    )
 
-    # For matics table
-    matrics_table = dbc.Table([
+def render_article_window(article_name, article_key, last_revid, start, end):
+    revisions = get_revision_window(article_key, start, end, last_revid)
+    aggregates = article_window_aggregates(revisions)
+    if aggregates is None:
+        return html.Div([
+            html.H1(f"{article_name}", style={"textAlign": "center"}),
+            html.P("No edits in this time window.", style={"textAlign": "center"}),
+        ])
+
+    prefetch.queue("contributor", aggregates["top_contributors"].index)
+    # Zooming re-queries the whole history's daily counts, the window's are
+    # all sent already
+    return build_article_view(
+        article_name, aggregates,
+        html.P("The forecast is based on the full history, clear the time window to see it.", style={"textAlign": "center"}),
+        render_edit_wars_section(edit_wars.detect(revisions)),
+        zoomable=False,
+    )
+
+def render_edit_wars_section(edit_wars):
+    if edit_wars is None:
+        return html.P("No revert data available for this article.", style={"textAlign": "center"})
+
+    summary_table = dbc.Table([
         html.Tr([html.Th("Matrics"), html.Th("Value")]),
-        html.Tr([html.Td("Total Edits"), html.Td(total_edits)]),
-        html.Tr([html.Td("Number of Contributors"), html.Td(total_contributors)]),
-        html.Tr([html.Td("Most Recent Edit"), html.Td(format_timestamp_readable(latest_rev_timestamp))]),
+        html.Tr([html.Td("Reverts"), html.Td(f"{edit_wars['reverts']} ({edit_wars['revert_rate']:.1%} of edits)")]),
+        html.Tr([html.Td("Mutual Reverts"), html.Td(edit_wars["mutual_reverts"])]),
+        html.Tr([html.Td("Longest Revert Chain"), html.Td(edit_wars["longest_chain"])]),
+        html.Tr([html.Td("Controversy Score"), html.Td(edit_wars["controversy"])]),
     ])
+    if edit_wars["warring_pairs"].empty:
+        return [summary_table, html.P("No editors reverted each other.", style={"textAlign": "center"})]
 
-    df_rev['timestamp'] = pd.to_datetime(df_rev['timestamp'], errors='coerce')
-    # dataframe for making future prediction
-    df_forecast = df_rev.resample('MS', on='timestamp').size().reset_index(name='y')  # 'MS' = Month Start
-    df_forecast.columns = ['ds', 'y']
+    import plotly.express as px
 
-    # Removing timezone
-    df_forecast['ds'] = df_forecast['ds'].dt.tz_localize(None)
+    intensity_fig = px.area(
+        timeline.downsample(edit_wars["intensity"]),
+        x = "timestamp",
+        y = "count",
+        labels = { "count": "War Intensity", "timestamp": "Time" },
+    )
+    pairs = edit_wars["warring_pairs"].copy()
+    for column in ["Editor", "Opponent"]:
+        pairs[column] = pairs[column].apply(
+            lambda name: dcc.Link(name, href=f"/contributor/{name.replace(' ', '_')}", refresh=True),
+        )
 
-    # Create a model and fit the dataframe
-    model = Prophet()
-    model.fit(df_forecast)
+    return [
+        summary_table,
+        dcc.Graph(figure = intensity_fig, style = {"width": "100%"}),
+        dbc.Table.from_dataframe(pairs),
+    ]
 
-    today = datetime.today()
+@metrics.timed("forecast_section")
+def render_forecast_section(article_key, last_revid, aggregates):
+    # Slow engines fit in a worker process and are filled in by update_forecast,
+    # unless this month's forecast has already been computed
+    forecast_month = forecast.last_complete_month()
+    forecast_result = forecast.get_cached_forecast(article_key, forecast_month)
+    polling = False
+    if forecast_result is not None:
+        forecast_panel = render_forecast_figure(forecast_result)
+    elif not forecast.is_complete(article_key, last_revid):
+        forecast_panel = html.P("The forecast is shown once the full history is loaded.")
+    elif config.FORECAST_ENGINE in forecast.INLINE_ENGINES:
+        try:
+            forecast_panel = render_forecast_figure(
+                forecast.compute_forecast(article_key, last_revid, forecast_month, aggregates["monthly"])
+            )
+        except Exception as e:
+            print(f"Error forecasting {article_key}: {e}")
+            forecast_panel = html.P("Forecast unavailable.", style={"color": "red"})
+    else:
+        forecast.submit(article_key, last_revid, forecast_month, aggregates["monthly"])
+        forecast_panel = [dbc.Spinner(color="primary"), html.P("Computing forecast...")]
+        polling = True
 
-    next_thirty_days = pd.date_range(start=today, periods=12, freq='M')
-    future = pd.DataFrame({'ds': next_thirty_days})
-    future_forecast = model.predict(future)
+    return [
+        html.Div(
+            id=ids.FORECAST_CONTAINER,
+            children=forecast_panel,
+            style={"textAlign": "center"},
+        ),
+        dcc.Interval(
+            id=ids.FORECAST_INTERVAL,
+            interval=config.FORECAST_POLL_INTERVAL_MS,
+            disabled=not polling,
+        ),
+        dcc.Store(
+            id=ids.FORECAST_JOB,
+            data={"article": article_key, "revid": last_revid, "month": forecast_month.isoformat()},
+        ),
+    ]
 
-    forecast_fig = model.plot(future_forecast)
-    axes = forecast_fig.gca()
-    axes.set_xlim([today, future_forecast['ds'].max()]) 
-    axes.set_xlabel("Date")
-    axes.set_ylabel("Number of Edits")
-    
-    forecast_fig_base64 = fig_to_base64(forecast_fig)
+@metrics.timed("article_view")
+def build_article_view(article_name, aggregates, forecast_section, edit_wars_section, zoomable=True):
+    # For matics table
+    matrics_table = dbc.Table([
+        html.Tr([html.Th("Matrics"), html.Th("Value")]),
+        html.Tr([html.Td("Total Edits"), html.Td(aggregates["total_edits"])]),
+        html.Tr([html.Td("Number of Contributors"), html.Td(aggregates["total_contributors"])]),
+        html.Tr([html.Td("Most Recent Edit"), html.Td(format_timestamp_readable(aggregates["latest_rev_timestamp"]))]),
+    ])
 
-    top_contributors_arr = get_top_10_contributors(df_rev)
-    df_top_contributors = top_contributors_arr.reset_index()
+    df_top_contributors = aggregates["top_contributors"].reset_index()
     df_top_contributors.columns = ["Contributors", "No of Edits"]
 
     df_top_contributors["Contributors"] = df_top_contributors["Contributors"].apply(
-        lambda name: dcc.Link(name, href=f"/contributor/{name.replace(" ", "_")}", refresh=True),
+        lambda name: dcc.Link(name, href=f"/contributor/{name.replace(' ', '_')}", refresh=True),
     )
 
     contributors_table = dbc.Table.from_dataframe(
         df_top_contributors
     )
 
-    daily_count = df_rev.groupby(df_rev["timestamp"].dt.date).size().reset_index(name="count")
-
-    add_activity_timeline(df_rev)
-    timeline_fig = px.line(
-        daily_count,
-        x = "timestamp",
-        y = "count",
-        labels = { "count": "Total Edits", "timestamp": "Time" },
-    )
+    import plotly.express as px
 
-    hour_fig = px.histogram(
-        df_rev,
+    # The hours are binned in the store, the figure only gets the 24 counts
+    hour_fig = px.bar(
+        aggregates["hour_count"],
         x = "hour",
-        nbins = 24,
+        y = "count",
         labels = { "hour": "Hour of the Day", "count": "Number of Edits" },
     )
 
@@ -134,9 +340,14 @@ def on_page_load(_, pathname):
                 html.Div([
                     html.H3("Edit Forecast"),
                     html.Div(
-                        children=[
-                            html.Img(src=f"data:image/png;base64,{forecast_fig_base64}", style={"margin": "auto"}), 
-                        ],
+                        children=forecast_section,
+                        style={"width": "100%", "display": "flex", "flexDirection": "column", "alignItems": "center"}
+                    )
+                ], style={"marginTop": "20px"}),
+                html.Div([
+                    html.H3("Edit Wars"),
+                    html.Div(
+                        children=edit_wars_section,
                         style={"width": "100%", "display": "flex", "flexDirection": "column", "alignItems": "center"}
                     )
                 ], style={"marginTop": "20px"}),
@@ -153,7 +364,8 @@ def on_page_load(_, pathname):
                     html.H3("Edit activity over time"),
                     html.Div(
                         children=[
-                            dcc.Graph(figure = timeline_fig)
+                            dcc.Graph(id = ids.ARTICLE_TIMELINE, figure = render_timeline_figure(aggregates["daily_count"])),
+                            dcc.Store(id = ids.ARTICLE_TIMELINE_KEY, data = page_key(article_name) if zoomable else None),
                         ],
                         style={"width": "100%", "display": "flex", "flexDirection": "column", "alignItems": "center"}
                     )
@@ -172,24 +384,84 @@ def on_page_load(_, pathname):
         )
     ])
 
-def layout(article_name=None, **kwargs):
+@callback(
+    Output(ids.ARTICLE_TIMELINE, "figure"),
+    Input(ids.ARTICLE_TIMELINE, "relayoutData"),
+    State(ids.ARTICLE_TIMELINE_KEY, "data"),
+    prevent_initial_call=True,
+)
+def on_timeline_zoom(relayout_data, article_key):
+    window = timeline.zoom_range(relayout_data)
+    if window is None or article_key is None:
+        return no_update
+    return render_timeline_figure(timeline.load_window("revisions", article_key, *window))
+
+@callback(
+    Output(ids.FORECAST_CONTAINER, "children"),
+    Output(ids.FORECAST_INTERVAL, "disabled"),
+    Input(ids.FORECAST_INTERVAL, "n_intervals"),
+    State(ids.FORECAST_JOB, "data"),
+    # The section is rendered complete, only a running fit is polled
+    prevent_initial_call=True,
+)
+def update_forecast(_, forecast_job):
+    article_key = forecast_job["article"]
+    forecast_month = pd.Timestamp(forecast_job["month"])
+    job = forecast.get_job(forecast.job_key(article_key, forecast_month))
+    if job is None:
+        # The page was rendered by another worker process, which may already be done
+        forecast_result = forecast.get_cached_forecast(article_key, forecast_month)
+        if forecast_result is not None:
+            return render_forecast_figure(forecast_result), True
+        if config.FORECAST_ENGINE in forecast.INLINE_ENGINES:
+            # The page already fitted it inline, and that failed
+            return html.P("Forecast unavailable.", style={"color": "red"}), True
+
+        aggregates = get_article_aggregates(article_key, forecast_job["revid"])
+        if aggregates is None:
+            return html.P("Forecast unavailable.", style={"color": "red"}), True
+        job = forecast.submit(article_key, forecast_job["revid"], forecast_month, aggregates["monthly"])
+        if job is None:
+            return html.P("The forecast is shown once the full history is loaded."), True
+
+    if not job.done():
+        return no_update, False
+
+    if job.exception() is not None:
+        print(f"Error forecasting {article_key}: {job.exception()}")
+        return html.P("Forecast unavailable.", style={"color": "red"}), True
+
+    return render_forecast_figure(job.result()), True
+
+def layout(article_name=None, start=None, end=None, **kwargs):
+    # ?start=2024-01-01&end=2024-01-31 opens the page on that window
     return html.Div(
         children=[
             dcc.Location(id="url", refresh=False),
+            html.Div(
+                children=[
+                    html.Span("Time window: ", style={"marginRight": "10px"}),
+                    dcc.DatePickerRange(
+                        id=ids.ARTICLE_WINDOW,
+                        start_date=start,
+                        end_date=end,
+                        display_format="YYYY-MM-DD",
+                        clearable=True,
+                    ),
+                ],
+                style={"marginTop": "20px", "textAlign": "right", "color": "#fe6f1f"}
+            ),
             dcc.Loading(
                 id="loading-spinner",
                 type="circle",
                 children=[
                     html.Div(id=ids.ARTICLE_DETAILS_CONTAINER)
                 ],
+                # Polling the fetch and forecast jobs must not blank out the whole page
+                target_components={ids.ARTICLE_DETAILS_CONTAINER: "children"},
                 style={"marginTop": "100px"}
             )
         ],
         id="layout-container",
         style={ "width" : "80vw", "margin": "auto" }  
     )
-
-def fig_to_base64(fig):
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight")
-    return base64.b64encode(buf.getvalue()).decode()
\ No newline at end of file
@@ -1,11 +1,14 @@
 import dash
-from dash import dcc, html, Input, Output, State, dash_table, register_page, callback
+from dash import dcc, html, Input, Output, State, dash_table, register_page, callback, no_update
 import dash_bootstrap_components as dbc
-import plotly.express as px
 import pandas as pd
 import requests
-from src.helpers import fetch_contributor_data
+import time
+from src.helpers import get_contributor_aggregates, get_contribution_window, get_last_contribution_revid, is_synced, format_timestamp_readable, time_window
+from src.aggregates import contributor_aggregates
+from src.store import page_key
 from src.constants import ids
+from src import config, metrics, store, sync_jobs, timeline
 
 register_page(__name__, path_template="contributor/<contributor_username>")
 
@@ -13,51 +16,174 @@ register_page(__name__, path_template="contributor/<contributor_username>")
         Output(ids.CONTRIBUTOR_DETAILS_CONTAINER, "children"),
         Input("layout-container", "children"),
         State("url", "pathname"),
+        State(ids.CONTRIBUTOR_WINDOW, "start_date"),
+        State(ids.CONTRIBUTOR_WINDOW, "end_date"),
 )
-def on_page_load(_, pathname):
+def on_page_load(_, pathname, start_date, end_date):
+    started = time.monotonic()
     contributor_username = pathname.split("/")[-1]
-    print(contributor_username)
 
     if not contributor_username:
         return html.P("Please enter a username.")
 
-    data = fetch_contributor_data(contributor_username)
+    username = page_key(contributor_username)
+    last_revid = get_last_contribution_revid(username)
+    sync_job = {"name": contributor_username, "username": username, "revid": last_revid, "window": time_window(start_date, end_date)}
 
-    if data is None or data.empty:
-        return "", {}, {}, [], f"No data found for user '{contributor_username}'."
+    content, job = render_content(sync_job)
+    if job is None:
+        sync_jobs.record_first_paint(time.monotonic() - started)
 
-    # Global Stats
-    total_edits = len(data)
-    unique_articles = data["title"].nunique()
+    return html.Div([
+        html.Div(id=ids.CONTRIBUTOR_SYNC_CONTENT, children=content),
+        dcc.Interval(id=ids.CONTRIBUTOR_SYNC_INTERVAL, interval=config.SYNC_POLL_INTERVAL_MS, disabled=job is None),
+        dcc.Interval(id=ids.CONTRIBUTOR_LIVE_INTERVAL, interval=config.LIVE_REFRESH_INTERVAL_MS or 1, disabled=not config.LIVE_REFRESH_INTERVAL_MS),
+        dcc.Store(id=ids.CONTRIBUTOR_SYNC_JOB, data=sync_job),
+    ])
 
-    metrics = html.Div([
-        dbc.Row([
-            dbc.Col(dbc.Card([dbc.CardHeader("Total Edits"), dbc.CardBody(html.H4(total_edits))])),
-            dbc.Col(dbc.Card([dbc.CardHeader("Articles Edited"), dbc.CardBody(html.H4(unique_articles))])),
-        ], className="mb-3"),
+def render_content(sync_job):
+    # Contribution histories that still need fetching are loaded by a background
+    # job and the page shows what is stored so far until it finishes. A time
+    # window is counted straight away.
+    contributor_username, username, last_revid = sync_job["name"], sync_job["username"], sync_job["revid"]
+    if sync_job["window"]:
+        return render_contributor_window(contributor_username, username, last_revid, *sync_job["window"]), None
+    if last_revid is not None and not is_synced("contributions", username, last_revid):
+        job = sync_jobs.start("contributions", username, last_revid)
+        return render_partial_contributor(contributor_username, username, job), job
+    return render_contributor(contributor_username, username, last_revid), None
+
+@callback(
+    Output(ids.CONTRIBUTOR_SYNC_CONTENT, "children", allow_duplicate=True),
+    Output(ids.CONTRIBUTOR_SYNC_INTERVAL, "disabled", allow_duplicate=True),
+    Output(ids.CONTRIBUTOR_SYNC_JOB, "data", allow_duplicate=True),
+    Input(ids.CONTRIBUTOR_WINDOW, "start_date"),
+    Input(ids.CONTRIBUTOR_WINDOW, "end_date"),
+    State(ids.CONTRIBUTOR_SYNC_JOB, "data"),
+    prevent_initial_call=True,
+)
+def on_window_change(start_date, end_date, sync_job):
+    if sync_job is None:
+        # The page is still loading and picks the window up itself
+        return no_update, no_update, no_update
+    sync_job = {**sync_job, "window": time_window(start_date, end_date)}
+    content, job = render_content(sync_job)
+    return content, job is None, sync_job
+
+@callback(
+    Output(ids.CONTRIBUTOR_SYNC_CONTENT, "children"),
+    Output(ids.CONTRIBUTOR_SYNC_INTERVAL, "disabled"),
+    Input(ids.CONTRIBUTOR_SYNC_INTERVAL, "n_intervals"),
+    State(ids.CONTRIBUTOR_SYNC_JOB, "data"),
+    prevent_initial_call=True,
+)
+def on_sync_progress(_, sync_job):
+    if sync_job["window"]:
+        return no_update, True
+    contributor_username, username, last_revid = sync_job["name"], sync_job["username"], sync_job["revid"]
+    job = sync_jobs.get("contributions", username)
+    if job is None and not is_synced("contributions", username, last_revid):
+        # The fetch was started by another worker process, continue it here
+        job = sync_jobs.start("contributions", username, last_revid)
+
+    if job is None or (job.done() and job.error is None):
+        return render_contributor(contributor_username, username, last_revid), True
+    # A failed fetch leaves what it stored so far, shown with the error
+    # instead of fetching again while the page polls
+    return render_partial_contributor(contributor_username, username, job), job.done()
+
+@callback(
+    Output(ids.CONTRIBUTOR_SYNC_CONTENT, "children", allow_duplicate=True),
+    Output(ids.CONTRIBUTOR_SYNC_JOB, "data", allow_duplicate=True),
+    Input(ids.CONTRIBUTOR_LIVE_INTERVAL, "n_intervals"),
+    State(ids.CONTRIBUTOR_SYNC_JOB, "data"),
+    State(ids.CONTRIBUTOR_SYNC_INTERVAL, "disabled"),
+    prevent_initial_call=True,
+)
+def on_live_update(_, sync_job, synced):
+    # Contributions stored since the page was rendered are shown without a reload
+    if not synced:
+        return no_update, no_update
+    sync_state = store.get_sync_state("contributions", sync_job["username"])
+    if sync_state is None or sync_state[1] == sync_job["revid"]:
+        return no_update, no_update
+    sync_job = {**sync_job, "revid": sync_state[1]}
+    return render_content(sync_job)[0], sync_job
+
+def render_partial_contributor(contributor_username, username, job):
+    aggregates = contributor_aggregates(username)
+    failed = html.P(
+        f"Fetching the contributions failed, reload the page to retry: {job.error}",
+        style={"textAlign": "center", "color": "red"},
+    )
+    if aggregates is None:
+        return html.Div([
+            html.H1("Contributor Details", style={'textAlign': 'center'}),
+            failed if job.error else html.P("Fetching contributions...", style={"textAlign": "center"}),
+            None if job.error else dbc.Progress(value=100, striped=True, animated=True),
+        ])
+
+    job.record_first_paint()
+    first_edit = pd.Timestamp(aggregates["daily_count"]["timestamp"].iloc[0])
+    progress = sync_jobs.progress(first_edit, aggregates["latest_edit_timestamp"])
+    loaded = f"{aggregates['total_edits']} contributions loaded, up to {format_timestamp_readable(aggregates['latest_edit_timestamp'])}"
+    return html.Div([
+        dbc.Progress(value=progress, label=f"{progress}%", striped=not job.error, animated=not job.error, style={"marginBottom": "5px"}),
+        html.P(loaded, style={"textAlign": "center"}),
+        failed if job.error else None,
+        build_contributor_view(contributor_username, aggregates),
     ])
 
-    daily_count = data.groupby(data["timestamp"].dt.date).size().reset_index(name="count")
+def render_contributor(contributor_username, username, last_revid):
+    aggregates = get_contributor_aggregates(username, last_revid)
+
+    if aggregates is None:
+        return html.P(f"No data found for user '{contributor_username}'.")
+
+    return build_contributor_view(contributor_username, aggregates)
+
+def render_contributor_window(contributor_username, username, last_revid, start, end):
+    aggregates = get_contribution_window(username, start, end, last_revid)
+    if aggregates is None:
+        return html.P(f"No contributions by '{contributor_username}' in this time window.")
+
+    return build_contributor_view(contributor_username, aggregates, zoomable=False)
+
+def render_timeline_figure(daily_count):
+    # Imported on first use, the pages are all imported at startup
+    import plotly.express as px
 
     timeline_fig = px.line(
-        daily_count,
+        timeline.downsample(daily_count),
         x="timestamp",
         y="count",
         labels={"count": "Cumulative Edits", "timestamp": "Time"}
     )
+    # Keeps the user's zoom when the zoomed-in range is sent back
+    timeline_fig.update_layout(uirevision="timeline")
+    return timeline_fig
 
-    data["hour"] = data["timestamp"].dt.hour
-    hour_fig = px.histogram(
-        data,
+@metrics.timed("contributor_view")
+def build_contributor_view(contributor_username, aggregates, zoomable=True):
+    summary = html.Div([
+        dbc.Row([
+            dbc.Col(dbc.Card([dbc.CardHeader("Total Edits"), dbc.CardBody(html.H4(aggregates["total_edits"]))])),
+            dbc.Col(dbc.Card([dbc.CardHeader("Articles Edited"), dbc.CardBody(html.H4(aggregates["unique_articles"]))])),
+        ], className="mb-3"),
+    ])
+
+    import plotly.express as px
+
+    # The hours are binned in the store, the figure only gets the 24 counts
+    hour_fig = px.bar(
+        aggregates["hour_count"],
         x="hour",
-        nbins=24,
+        y="count",
         title="Edit Activity by Hour of the Day",
         labels={"hour": "Hour", "count": "Number of Edits"}
     )
 
-    top_articles = data["title"].value_counts().reset_index()
-    top_articles.columns = ["Article Name", "Edits"]
-    table_data = top_articles.head(10).to_dict("records")
+    table_data = aggregates["top_articles"].to_dict("records")
 
     return html.Div([
         html.H1("Contributor Details", style={'textAlign': 'center'}),
@@ -68,7 +194,7 @@ def on_page_load(_, pathname):
                     html.H3("Aggregated Matrics"),
                     html.Div(
                         children=[
-                            metrics,
+                            summary,
                         ],
                         style={"width": "100%"}
                     )
@@ -77,7 +203,8 @@ def on_page_load(_, pathname):
                     html.H3(f"Edit Activity Over Time for '{contributor_username}'"),
                     html.Div(
                         children=[
-                            dcc.Graph(id=ids.ACTIVITY_TIMELINE, figure=timeline_fig),
+                            dcc.Graph(id=ids.ACTIVITY_TIMELINE, figure=render_timeline_figure(aggregates["daily_count"])),
+                            dcc.Store(id=ids.CONTRIBUTOR_TIMELINE_KEY, data=page_key(contributor_username) if zoomable else None),
                         ],
                         style={"width": "100%"}
                     )
@@ -105,16 +232,44 @@ def on_page_load(_, pathname):
         )
     ])
 
-def layout(contributor_username=None, **kwargs):
+@callback(
+    Output(ids.ACTIVITY_TIMELINE, "figure"),
+    Input(ids.ACTIVITY_TIMELINE, "relayoutData"),
+    State(ids.CONTRIBUTOR_TIMELINE_KEY, "data"),
+    prevent_initial_call=True,
+)
+def on_timeline_zoom(relayout_data, username):
+    window = timeline.zoom_range(relayout_data)
+    if window is None or username is None:
+        return no_update
+    return render_timeline_figure(timeline.load_window("contributions", username, *window))
+
+def layout(contributor_username=None, start=None, end=None, **kwargs):
+   # ?start=2024-01-01&end=2024-01-31 opens the page on that window
    return html.Div(
         children=[
             dcc.Location(id="url", refresh=False),
+            html.Div(
+                children=[
+                    html.Span("Time window: ", style={"marginRight": "10px"}),
+                    dcc.DatePickerRange(
+                        id=ids.CONTRIBUTOR_WINDOW,
+                        start_date=start,
+                        end_date=end,
+                        display_format="YYYY-MM-DD",
+                        clearable=True,
+                    ),
+                ],
+                style={"marginTop": "20px", "textAlign": "right", "color": "#fe6f1f"}
+            ),
             dcc.Loading(
                 id="loading-spinner",
                 type="circle",
                 children=[
                     html.Div(id=ids.CONTRIBUTOR_DETAILS_CONTAINER)
                 ],
+                # Polling the fetch job must not blank out the whole page
+                target_components={ids.CONTRIBUTOR_DETAILS_CONTAINER: "children"},
                 style={"marginTop": "100px"}
             )
         ],
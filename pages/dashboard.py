@@ -1,60 +1,138 @@
-from dash import html, Input, Output, State, page_container, register_page, callback, ALL, ctx, dcc
+import re
+from dash import html, Input, Output, State, page_container, register_page, callback, ALL, ctx, dcc, no_update
 import pandas as pd
 import dash_bootstrap_components as dbc 
 from src.constants import ids
 from src.components import search_bar, article_matrics
-from src.helpers import get_article_stats
-from src.components import comparison_graph, article_name_badges
+from src.helpers import get_category_articles, get_co_editors, get_many_article_stats
+from src import config, metrics, prefetch, store
+from src.components import comparison_graph, article_name_badges, co_editor_overlap
 
 register_page(__name__, path="/")
 
-articles_data = pd.DataFrame(columns=[
+COLUMNS = [
     "Article Name",
     "Total Edits",
     "Number of Contributors",
     "Last Edit Timestamp"
-])
+]
+MAX_COMPARED_ARTICLES = 100
 
+def parse_search(search_value):
+    # One article per line or separated by "|", "Category:Name" adds the
+    # articles in that category
+    article_names = []
+    for name in re.split(r"[|\n]", search_value):
+        name = name.strip()
+        if name.lower().startswith("category:"):
+            article_names.extend(get_category_articles("Category:" + name.split(":", 1)[1].strip(), MAX_COMPARED_ARTICLES))
+        elif name:
+            article_names.append(name)
+    return unique_articles(article_names)
+
+def unique_articles(article_names):
+    # The first name of every article, "Earth_moon" and "Earth moon" are the
+    # same page in the store
+    first = {}
+    for article_name in article_names:
+        first.setdefault(store.page_key(article_name), article_name)
+    return list(first.values())
+
+def stored_revids(article_names):
+    # The newest stored revision of each compared article
+    keys = {article_name: store.page_key(article_name) for article_name in article_names}
+    revids = store.get_sync_revids("revisions", keys.values())
+    return {article_name: revids.get(key) for article_name, key in keys.items()}
+
+def render_comparison(compared_articles, stats=None):
+    # The badges, metrics table and comparison graphs of the compared articles,
+    # and the stored revisions they show
+    if stats is None:
+        stats = get_many_article_stats(compared_articles)
+    articles_data = pd.DataFrame(stats, columns=COLUMNS)
+    revids = stored_revids(compared_articles)
+
+    if articles_data.shape[0] == 0:
+        return None, None, None, revids
+    # Every badge links to the article's details page
+    prefetch.queue("article", articles_data["Article Name"])
+    with metrics.stage("comparison_view"):
+        comparison = [comparison_graph.render(articles_data)]
+        if articles_data.shape[0] > 1:
+            article_names = articles_data["Article Name"].tolist()
+            overlap = get_co_editors([store.page_key(name) for name in article_names], [revids.get(name) for name in article_names])
+            comparison.append(co_editor_overlap.render(overlap, article_names))
+        return article_name_badges.render(articles_data), article_matrics.render(articles_data), comparison, revids
+
+def comparison_layout(badges, matrics, comparison):
+    return [
+        html.Div(id=ids.BADGE_CONTAINER, children=badges),
+        html.Div(
+            children=[
+                html.Div(id=ids.ARTICLE_MATRICS_CONTAINER, children=matrics),
+                html.Div(id=ids.COMPARISON_GRAPH_CONTAINER, children=comparison),
+            ],
+            style={"display": "flex", "justifyContent": "space-around", "alignItems": "flex-start", "gap": "10px"}
+        ),
+    ]
+
+# The compared article names live in the browser session; the per-article data
+# comes from the on-disk revision store that every worker process shares.
 @callback(
     [
-        Output(ids.ARTICLE_MATRICS_CONTAINER, "children"),
-        Output(ids.COMPARISON_GRAPH_CONTAINER, "children"),
-        Output(ids.BADGE_CONTAINER, "children"),
+        Output(ids.DASHBOARD_CONTENT, "children"),
+        Output(ids.COMPARISON_STORE, "data"),
+        Output(ids.SEARCH_ERROR_MESSAGE, "children"),
+        Output(ids.COMPARISON_REVIDS, "data"),
     ],
     Input(ids.SEARCH_BUTTON, "n_clicks"),
     Input({"type": ids.REMOVE_BUTTON, "index": ALL}, "n_clicks"),
     State(ids.SEARCH_INPUT, "value"),
+    State(ids.COMPARISON_STORE, "data"),
 )
-def update_matrics(_a, _b,search_value):
-    global articles_data
+def update_matrics(_a, _b, search_value, compared_articles):
+    compared_articles = unique_articles(compared_articles or [])
+    error = None
+    stats = None
 
     if ctx.triggered_id == ids.SEARCH_BUTTON:
         if not search_value:
-            return ""
-        searched_article_data = get_article_stats(search_value)
-        if not searched_article_data:
-            return (
-                f"Article '{search_value}' not found or no data available.",
-                ""
-            )
+            return (no_update,) * 4
+        compared_keys = {store.page_key(name) for name in compared_articles}
+        searched_articles = [name for name in parse_search(search_value) if store.page_key(name) not in compared_keys]
+        # The searched and the already compared articles in one fetch, which
+        # also gives the comparison its data
+        stats = get_many_article_stats(compared_articles + searched_articles)
+        found = {article_stats["Article Name"] for article_stats in stats}
+        missing = [name for name in searched_articles if name not in found]
+        if missing:
+            error = f"Not found or no data available: {', '.join(missing)}"
+        compared_articles = (compared_articles + [name for name in searched_articles if name in found])[-MAX_COMPARED_ARTICLES:]
+        stats = [article_stats for article_stats in stats if article_stats["Article Name"] in compared_articles]
 
-        if len(articles_data) == 3:
-            articles_data = articles_data.iloc[1:]
-        articles_data = pd.concat([articles_data, pd.DataFrame([searched_article_data])], ignore_index=True)
-
-    elif isinstance(ctx.triggered_id, dict) and ctx.triggered_id.get("type") == ids.REMOVE_BUTTON:
+    elif isinstance(ctx.triggered_id, dict) and ctx.triggered_id.get("type") == ids.REMOVE_BUTTON and ctx.triggered[0]["value"]:
         deleted_article = ctx.triggered_id["index"]
-        articles_data = articles_data[articles_data["Article Name"] != deleted_article]
+        compared_articles = [name for name in compared_articles if name != deleted_article]
 
+    *rendered, revids = render_comparison(compared_articles, stats)
+    return comparison_layout(*rendered), compared_articles, error, revids
 
-    if articles_data.shape[0] == 0:
-        return None
-    else:
-        return (
-            article_matrics.render(articles_data),
-            comparison_graph.render(articles_data),
-            article_name_badges.render(articles_data)
-        )
+# Re-renders inside the loading spinner's target, so a refresh doesn't flash it
+@callback(
+    Output(ids.BADGE_CONTAINER, "children"),
+    Output(ids.ARTICLE_MATRICS_CONTAINER, "children"),
+    Output(ids.COMPARISON_GRAPH_CONTAINER, "children"),
+    Output(ids.COMPARISON_REVIDS, "data", allow_duplicate=True),
+    Input(ids.DASHBOARD_LIVE_INTERVAL, "n_intervals"),
+    State(ids.COMPARISON_STORE, "data"),
+    State(ids.COMPARISON_REVIDS, "data"),
+    prevent_initial_call=True,
+)
+def on_live_update(_, compared_articles, rendered_revids):
+    # Only re-rendered once new edits to a compared article were stored
+    if not compared_articles or stored_revids(compared_articles) == rendered_revids:
+        return (no_update,) * 4
+    return render_comparison(compared_articles)
 
 
 layout = html.Div(
@@ -67,19 +145,16 @@ layout = html.Div(
             style={"width":"100%", "text-align": "center"}
         ),
         search_bar.render(),
+        dcc.Store(id=ids.COMPARISON_STORE, storage_type="session", data=[]),
+        dcc.Store(id=ids.COMPARISON_REVIDS, data={}),
+        dcc.Interval(id=ids.DASHBOARD_LIVE_INTERVAL, interval=config.LIVE_REFRESH_INTERVAL_MS or 1, disabled=not config.LIVE_REFRESH_INTERVAL_MS),
         dcc.Loading(
             id="loading-spinner",
             type="circle",
             children=[
-                html.Div(id=ids.BADGE_CONTAINER),
-                html.Div(
-                    children=[
-                        html.Div(id=ids.ARTICLE_MATRICS_CONTAINER),
-                        html.Div(id=ids.COMPARISON_GRAPH_CONTAINER),
-                    ],
-                    style={"display": "flex", "justifyContent": "space-around", "alignItems": "flex-start", "gap": "10px"}
-                )
-            ]
+                html.Div(id=ids.DASHBOARD_CONTENT, children=comparison_layout(None, None, None)),
+            ],
+            target_components={ids.DASHBOARD_CONTENT: "children"},
         )
     ],
     style={ "width" : "80vw", "margin": "auto" }
@@ -0,0 +1,177 @@
+import time
+from collections import Counter
+import numpy as np
+import pandas as pd
+from src import config, frames, metrics, store
+
+# Rough size of one counted bucket: a dict entry, its key and its count
+BUCKET_BYTES = 200
+
+def _daily_frame(daily):
+    days = pd.DataFrame(daily, columns=["day", "edits"])
+    days["timestamp"] = pd.to_datetime(days["day"] * 86400, unit="s").dt.date
+    return days
+
+def daily_count(daily):
+    return _daily_frame(daily)[["timestamp", "edits"]].rename(columns={"edits": "count"})
+
+def _hour_count(hourly):
+    return (
+        pd.Series(dict(hourly), dtype="int64")
+        .reindex(range(24), fill_value=0)
+        .rename_axis("hour")
+        .reset_index(name="count")
+    )
+
+def _monthly(days):
+    df_forecast = (
+        days.assign(ds=pd.to_datetime(days["day"] * 86400, unit="s"))
+        .resample("MS", on="ds")["edits"].sum()  # 'MS' = Month Start
+        .reset_index()
+    )
+    df_forecast.columns = ["ds", "y"]
+    return df_forecast
+
+def load_index(kind, key):
+    index = store.load_aggregates(kind, key)
+    if not index["daily"]:
+        # Rows stored before the index existed are indexed on first read
+        store.rebuild_aggregates(kind, key)
+        index = store.load_aggregates(kind, key)
+    return index
+
+def _article_view(index, latest_timestamp):
+    days = _daily_frame(index["daily"])
+    return {
+        "total_edits": int(days["edits"].sum()),
+        "total_contributors": index["distinct"],
+        "latest_rev_timestamp": latest_timestamp,
+        "monthly": _monthly(days),
+        "top_contributors": pd.Series(dict(index["top"]), name="count", dtype="int64").rename_axis("user"),
+        "daily_count": days[["timestamp", "edits"]].rename(columns={"edits": "count"}),
+        "hour_count": _hour_count(index["hourly"]),
+    }
+
+@metrics.timed("article_aggregates")
+def article_aggregates(article_key):
+    sync_state = store.get_sync_state("revisions", article_key)
+    if sync_state is None:
+        return None
+    index = load_index("revisions", article_key)
+    if not index["daily"]:
+        return None
+    return _article_view(index, pd.Timestamp(sync_state[0]))
+
+@metrics.timed("article_window_aggregates")
+def article_window_aggregates(revisions, top=10):
+    # The same aggregates over a frame of revisions, e.g. a time window
+    if revisions is None or revisions.empty:
+        return None
+    seconds = revisions["timestamp"].astype(np.int64).to_numpy() // 10**9
+    days, edits = np.unique(seconds // 86400, return_counts=True)
+    hours = np.bincount(seconds // 3600 % 24, minlength=24)
+    editors = revisions["user"].value_counts()
+    editors = editors[editors > 0]
+    index = {
+        "daily": list(zip(days.tolist(), edits.tolist())),
+        "hourly": [(hour, int(count)) for hour, count in enumerate(hours) if count],
+        "distinct": len(editors),
+        "top": list(editors.head(top).items()),
+    }
+    return _article_view(index, revisions["timestamp"].max())
+
+def _contributor_view(index, latest_timestamp):
+    days = _daily_frame(index["daily"])
+    return {
+        "total_edits": int(days["edits"].sum()),
+        "unique_articles": index["distinct"],
+        "latest_edit_timestamp": latest_timestamp,
+        "daily_count": days[["timestamp", "edits"]].rename(columns={"edits": "count"}),
+        "hour_count": _hour_count(index["hourly"]),
+        "top_articles": pd.DataFrame(index["top"], columns=["Article Name", "Edits"]),
+    }
+
+@metrics.timed("contributor_aggregates")
+def contributor_aggregates(username):
+    sync_state = store.get_sync_state("contributions", username)
+    if sync_state is None:
+        return None
+    index = load_index("contributions", username)
+    if not index["daily"]:
+        return None
+    return _contributor_view(index, pd.Timestamp(sync_state[0]))
+
+def contributor_window_aggregates(counts):
+    # The same aggregates from the counts of some contributions, e.g. a time window
+    if counts.latest is None:
+        return None
+    return _contributor_view(counts.index(), pd.Timestamp(counts.latest["timestamp"]))
+
+class ContributionCounts:
+    # A user's new contributions counted into the buckets of their aggregate
+    # index, page by page as they are fetched. Only the counts are kept, and
+    # they are added to the store once they reach max_bytes or every
+    # flush_seconds, whichever comes first.
+
+    def __init__(self, username, cursor, max_bytes=None, flush_seconds=None):
+        self.username = username
+        self.cursor = cursor
+        self.max_bytes = max_bytes or config.CONTRIBUTIONS_BUFFER_BYTES
+        self.flush_seconds = flush_seconds if flush_seconds is not None else config.SYNC_POLL_INTERVAL_MS / 1000
+        self.counts = {aggregate: Counter() for aggregate in store.AGGREGATES["contributions"]}
+        self.latest = None
+        self.rows = 0
+        self.flushed_at = time.monotonic()
+
+    def new(self, contribs):
+        # Contributions up to the cursor are already counted. The API resumes
+        # from its timestamp, which returns the ones made in the same second.
+        if self.cursor is None:
+            return contribs
+        return [c for c in contribs if (c["timestamp"], c["revid"]) > tuple(self.cursor)]
+
+    def add(self, contribs):
+        contribs = self.new(contribs)
+        if not contribs:
+            return 0
+        timestamps = frames.parse_timestamps([c["timestamp"] for c in contribs])
+        daily, hourly, articles = self.counts.values()
+        days, edits = np.unique(timestamps // 86400, return_counts=True)
+        daily.update(dict(zip(days.tolist(), edits.tolist())))
+        hours = np.bincount(timestamps // 3600 % 24, minlength=24)
+        hourly.update({hour: int(edits) for hour, edits in enumerate(hours) if edits})
+        articles.update(c["title"] for c in contribs if c.get("title") is not None)
+        self.latest = max(contribs + [self.latest] if self.latest else contribs, key=lambda c: (c["timestamp"], c["revid"]))
+        self.rows += len(contribs)
+        return len(contribs)
+
+    def index(self, top=10):
+        # The counts in the shape of store.load_aggregates
+        daily, hourly, articles = self.counts.values()
+        return {
+            "daily": sorted(daily.items()),
+            "hourly": list(hourly.items()),
+            "distinct": len(articles),
+            "top": articles.most_common(top),
+        }
+
+    @property
+    def nbytes(self):
+        return sum(map(len, self.counts.values())) * BUCKET_BYTES
+
+    def due(self):
+        return self.nbytes >= self.max_bytes or time.monotonic() - self.flushed_at >= self.flush_seconds
+
+    def flush(self):
+        # False when another process moved the user's sync state past the
+        # cursor in the meantime, these counts are then dropped
+        self.flushed_at = time.monotonic()
+        if self.latest is None:
+            return True
+        added = store.add_contribution_counts(self.username, self.counts, self.cursor, self.latest)
+        if added:
+            self.cursor = (self.latest["timestamp"], self.latest["revid"])
+        for buckets in self.counts.values():
+            buckets.clear()
+        self.latest = None
+        return added
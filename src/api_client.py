@@ -0,0 +1,213 @@
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from src import config, metrics
+
+# Only the fields the pages actually read. "ids" is the narrowest prop that
+# carries revid, there is no finer-grained option for it. The content hash and
+# size are what revert detection compares.
+REVISION_PROPS = "ids|timestamp|user|sha1|size"
+CONTRIBUTION_PROPS = "ids|title|timestamp"
+
+DEFAULT_PARAMS = {
+    "format": "json",
+    "formatversion": "2",
+    "maxlag": str(config.API_MAXLAG),
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+# Requests made by background threads, e.g. the prefetcher, wait for spare
+# tokens so they never hold up a page load
+_priority = threading.local()
+
+class APIError(Exception):
+    pass
+
+class _Flight(Future):
+    # Set once a foreground caller waits on the flight, its leader's requests
+    # then no longer yield to page loads
+    promoted = False
+
+class TokenBucket:
+    # Lets `rate` requests per second through, after an initial burst. The rate
+    # is halved when the API asks to back off and creeps back up on success.
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+        metrics.set_gauge("api_rate_limit", rate)
+
+    def acquire(self, reserve=0):
+        # Waits until `reserve` tokens would still be left after taking one
+        if self.max_rate <= 0:
+            return
+        needed = min(1 + reserve, self.burst)
+        metrics.inc("api_queue_depth")
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= needed:
+                        self.tokens -= 1
+                        return
+                    wait = (needed - self.tokens) / self.rate
+                time.sleep(wait)
+        finally:
+            metrics.inc("api_queue_depth", -1)
+
+    def back_off(self):
+        with self._lock:
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+        metrics.set_gauge("api_rate_limit", self.rate)
+
+    def recover(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            metrics.set_gauge("api_rate_limit", self.rate)
+
+rate_limiter = TokenBucket(config.API_RATE_LIMIT, config.API_BURST)
+
+def set_background(background):
+    # Marks the calling thread's requests as background work
+    _priority.background = background
+
+def is_background():
+    # Background threads are promoted while they lead a flight a foreground
+    # caller is waiting on
+    if not getattr(_priority, "background", False):
+        return False
+    return not any(flight.promoted for flight in getattr(_priority, "flights", ()))
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=config.HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "User-Agent": config.USER_AGENT,
+                    "Accept-Encoding": "gzip, deflate",
+                })
+                _session = session
+    return _session
+
+def single_flight(key, fn):
+    # Concurrent calls with the same key wait for the first one and share
+    # its result, instead of repeating the same upstream work
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = _Flight()
+        elif not is_background():
+            future.promoted = True
+    if not leader:
+        metrics.inc("api_coalesced_total", kind=key[0])
+        return future.result()
+
+    flights = _priority.__dict__.setdefault("flights", [])
+    flights.append(future)
+    try:
+        result = fn()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        flights.pop()
+        with _in_flight_lock:
+            del _in_flight[key]
+
+def _retry_after(response):
+    # Clamped, a misbehaving proxy must not park a request for hours
+    try:
+        return min(max(float(response.headers["Retry-After"]), 0.0), config.API_MAX_RETRY_AFTER)
+    except (KeyError, ValueError):
+        return None
+
+def _request(params, query):
+    error = retry_after = None
+    for attempt in range(config.API_MAX_RETRIES + 1):
+        if attempt:
+            metrics.inc("api_retries_total", query=query)
+            # Full jitter, so retrying clients don't come back in lockstep
+            time.sleep(retry_after if retry_after is not None else random.uniform(0, config.API_RETRY_BASE * 2 ** attempt))
+        rate_limiter.acquire(config.PREFETCH_RESERVE_TOKENS if is_background() else 0)
+
+        start = time.perf_counter()
+        try:
+            response = get_session().get(
+                config.API_URL,
+                params={**DEFAULT_PARAMS, **params},
+                timeout=(config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT),
+            )
+        except requests.RequestException as e:
+            metrics.inc("api_requests_total", query=query, outcome="error")
+            error, retry_after = e, None
+            continue
+        metrics.observe("api_request_seconds", time.perf_counter() - start, query=query)
+        metrics.inc("api_response_bytes_total", len(response.content), query=query)
+        metrics.inc("api_requests_total", query=query, outcome=str(response.status_code))
+
+        if response.status_code in RETRY_STATUSES:
+            if response.status_code == 429:
+                rate_limiter.back_off()
+            error, retry_after = APIError(f"HTTP {response.status_code}"), _retry_after(response)
+            continue
+        try:
+            response.raise_for_status()
+            data = response.json()
+        except (requests.HTTPError, ValueError) as e:
+            raise APIError(f"{query} request failed: {e}") from e
+
+        api_error = data.get("error")
+        if api_error is None:
+            rate_limiter.recover()
+            return data
+        if api_error.get("code") != "maxlag":
+            raise APIError(f"{api_error.get('code')}: {api_error.get('info')}")
+        # The database replicas are lagging, the API asks everyone to slow down
+        rate_limiter.back_off()
+        error, retry_after = APIError(api_error.get("info")), _retry_after(response) or config.API_MAXLAG
+
+    raise APIError(f"{query} request failed after {config.API_MAX_RETRIES + 1} attempts: {error}") from error
+
+def get(params):
+    query = params.get("list") or params.get("prop") or params.get("action", "query")
+    # Identical requests in flight at the same time are sent once
+    return single_flight(("get", *sorted(params.items())), lambda: _request(params, query))
+
+def iter_query(params):
+    params = {"action": "query", **params}
+    while True:
+        data = get(params)
+        yield data
+        if "continue" not in data:
+            break
+        params.update(data["continue"])
+
+def fetch_many(fn, items, max_workers=None):
+    items = list(dict.fromkeys(items))
+    if not items:
+        return {}
+    max_workers = min(max_workers or config.HTTP_MAX_CONCURRENCY, len(items))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(items, pool.map(fn, items)))
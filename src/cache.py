@@ -0,0 +1,95 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from src import config
+
+def estimate_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+class RevisionCache:
+    # LRU cache whose entries are tagged with the article's lastrevid. An entry
+    # is only served while its revid still matches the one the caller looked up,
+    # and no longer than ttl seconds.
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+
+    def get(self, namespace, key, revid):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                value, entry_revid, created, _ = entry
+                if entry_revid == revid and time.monotonic() - created < self.ttl:
+                    self._entries.move_to_end((namespace, key))
+                    self.hits[namespace] = self.hits.get(namespace, 0) + 1
+                    return value
+                self._remove((namespace, key))
+            self.misses[namespace] = self.misses.get(namespace, 0) + 1
+            return None
+
+    def set(self, namespace, key, revid, value):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if (namespace, key) in self._entries:
+                self._remove((namespace, key))
+            self._entries[(namespace, key)] = (value, revid, time.monotonic(), size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, namespace, key, revid, compute, cacheable=None):
+        # Without a revid there is nothing to validate against, so always recompute.
+        # Values cacheable() rejects, e.g. computed from a partial history, are
+        # returned without being kept.
+        if revid is not None:
+            value = self.get(namespace, key, revid)
+            if value is not None:
+                return value
+        value = compute()
+        if revid is not None and value is not None and (cacheable is None or cacheable(value)):
+            self.set(namespace, key, revid, value)
+        return value
+
+    def _remove(self, cache_key):
+        _, _, _, size = self._entries.pop(cache_key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+revision_cache = RevisionCache(config.CACHE_MAX_ENTRIES, config.CACHE_MAX_BYTES, config.CACHE_TTL)
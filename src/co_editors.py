@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from src import metrics, store
+
+# Editors shared between compared articles, from a sparse article x editor
+# matrix of edit counts. Its product with its own transpose counts the editors
+# every pair of articles has in common in one step, however many editors the
+# articles have.
+TOP_EDITORS = 10
+
+@metrics.timed("co_editors")
+def overlap(article_keys, top=TOP_EDITORS):
+    # Imported on first use, like plotly in the pages
+    from scipy import sparse
+
+    # A key given twice would be two rows of one article
+    article_keys = list(dict.fromkeys(article_keys))
+    counts = store.load_editor_counts(article_keys)
+    articles = pd.Categorical(counts["page"], categories=article_keys).codes
+    users = counts["user"].cat
+    matrix = sparse.csr_matrix(
+        (counts["edits"].to_numpy(), (articles, users.codes.to_numpy())),
+        shape=(len(article_keys), len(users.categories)),
+    )
+
+    edited = (matrix > 0).astype(np.int64)
+    shared = (edited @ edited.T).toarray()
+    editors = np.diag(shared).copy()
+    union = editors[:, None] + editors[None, :] - shared
+    jaccard = np.divide(shared, union, out=np.zeros(shared.shape), where=union > 0)
+
+    # Editors of more than one of the articles, by how many of them they
+    # edited and then by their edits to them
+    articles_edited = np.asarray(edited.sum(axis=0)).ravel()
+    edits = np.asarray(matrix.sum(axis=0)).ravel()
+    multiple = articles_edited > 1
+    cross = np.flatnonzero(multiple)
+    cross = cross[np.lexsort((-edits[cross], -articles_edited[cross]))][:top]
+
+    return {
+        "articles": article_keys,
+        "editors": editors,
+        "shared": shared,
+        "jaccard": jaccard,
+        "cross_editors": int(multiple.sum()),
+        "top_editors": pd.DataFrame({
+            "Editor": users.categories[cross],
+            "Articles": articles_edited[cross],
+            "Edits": edits[cross],
+        }),
+    }
@@ -1,20 +1,23 @@
-from dash import html
-import dash_bootstrap_components as dbc
+from dash import html, dash_table
 from src.constants import ids
-from src.helpers import format_timestamp_readable
 
 def render(articles_data):
-    articles_data_copy = articles_data.copy()
-    if not articles_data.empty:
-        articles_data_copy["Last Edit Timestamp"] = articles_data_copy["Last Edit Timestamp"].apply(format_timestamp_readable)
-
-    table = dbc.Table.from_dataframe(
-        articles_data_copy,
-        striped=True,
-        bordered=True,
-        hover=True,
-        responsive=True,
-        className="mt-3",
+    # Sorted and scrolled in the browser, only the visible rows are rendered.
+    # Timestamps stay ISO formatted so that they sort correctly.
+    table = dash_table.DataTable(
+        id=ids.ARTICLE_MATRICS,
+        data=articles_data.to_dict("records"),
+        columns=[
+            {"name": column, "id": column, "type": "numeric" if articles_data[column].dtype.kind in "iuf" else "text"}
+            for column in articles_data.columns
+        ],
+        sort_action="native",
+        page_action="none",
+        virtualization=True,
+        fixed_rows={"headers": True},
+        style_table={"height": "400px", "overflowY": "auto"},
+        style_cell={"textAlign": "left", "minWidth": "120px", "color": "black"},
+        style_header={"fontWeight": "bold"},
     )
 
     return html.Div(
@@ -0,0 +1,63 @@
+from dash import dcc, html
+import dash_bootstrap_components as dbc
+
+def render(overlap, article_names):
+    # Jaccard overlap of the articles' editors, with the number of shared
+    # editors on each cell, and the editors active on most of the articles
+    hover = [
+        [
+            f"{article_names[row]} / {article_names[column]}<br>"
+            f"{overlap['shared'][row][column]} shared editors, {overlap['jaccard'][row][column]:.1%} overlap"
+            for column in range(len(article_names))
+        ]
+        for row in range(len(article_names))
+    ]
+    size = 200 + 30 * len(article_names)
+    heatmap = dcc.Graph(
+        figure={
+            "data": [{
+                "type": "heatmap",
+                "z": overlap["jaccard"].round(4).tolist(),
+                "x": article_names,
+                "y": article_names,
+                "text": hover,
+                "hoverinfo": "text",
+                "colorscale": "Oranges",
+                "zmin": 0,
+                "zmax": 1,
+            }],
+            "layout": {
+                "title": "Shared Editors (Jaccard Overlap)",
+                "height": size,
+                "xaxis": {"automargin": True},
+                "yaxis": {"automargin": True, "autorange": "reversed"},
+                "paper_bgcolor": "rgba(0,0,0,0)",
+                "plot_bgcolor": "rgba(0,0,0,0)",
+            },
+        },
+    )
+
+    top_editors = overlap["top_editors"].copy()
+    top_editors["Editor"] = top_editors["Editor"].apply(
+        lambda name: dcc.Link(name, href=f"/contributor/{name.replace(' ', '_')}", refresh=True),
+    )
+    editors = (
+        dbc.Table.from_dataframe(top_editors)
+        if not top_editors.empty else html.P("No editor edited more than one of the articles.")
+    )
+
+    return html.Div(
+        children = [
+            heatmap,
+            html.H5(f"Top Cross-Article Editors ({overlap['cross_editors']} editors on more than one article)"),
+            editors,
+        ],
+        style={
+            "padding": "20px",
+            "borderRadius": "10px",
+            "backgroundColor": "#ffffff",
+            "margin": "auto",
+            "marginTop": "10px",
+            "color": "black",
+        }
+    )
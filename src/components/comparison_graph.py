@@ -1,20 +1,39 @@
 from dash import dcc, html
 
+# Beyond this many articles the bars are drawn horizontally, one row per article
+HORIZONTAL_AFTER = 10
+
 def render(articles_data) :
+    articles_data = articles_data.sort_values("Total Edits", ascending=False)
+    horizontal = len(articles_data) > HORIZONTAL_AFTER
+    names = articles_data["Article Name"]
+
+    def bars(column, name):
+        if horizontal:
+            return {"y": names, "x": articles_data[column], "type": "bar", "orientation": "h", "name": name}
+        return {"x": names, "y": articles_data[column], "type": "bar", "name": name}
+
+    layout = {
+        "title": "Graphical Comparison of Searched Articles",
+        "paper_bgcolor": "rgba(0,0,0,0)",
+        "plot_bgcolor": "rgba(0,0,0,0)",
+    }
+    if horizontal:
+        layout.update({
+            "height": 120 + 40 * len(articles_data),
+            "yaxis": {"autorange": "reversed", "automargin": True},
+        })
+
     return html.Div(
         children = [
             dcc.Graph(
                 id="comparison-graph", 
                 figure = {
                     "data": [
-                        {"x": articles_data["Article Name"], "y": articles_data["Total Edits"], "type": "bar", "name": "Total Edits"},
-                        {"x": articles_data["Article Name"], "y": articles_data["Number of Contributors"], "type": "bar", "name": "Contributors"},
+                        bars("Total Edits", "Total Edits"),
+                        bars("Number of Contributors", "Contributors"),
                     ],
-                    "layout": {
-                        "title": "Graphical Comparison of Searched Articles",
-                        "paper_bgcolor": "rgba(0,0,0,0)",
-                        "plot_bgcolor": "rgba(0,0,0,0)",
-                    },
+                    "layout": layout,
                 },
             ),
         ],
@@ -24,4 +43,4 @@ def render(articles_data) :
             "backgroundColor": "#ffffff",
             "margin": "auto",
         }
-    )
\ No newline at end of file
+    )
@@ -8,10 +8,11 @@ def render():
         children=[
             html.Div(
                 children = [
-                    dbc.Input(
+                    # Several articles can be pasted at once, one per line
+                    dbc.Textarea(
                         id=ids.SEARCH_INPUT,
-                        type="text",
-                        placeholder="enter article name",
+                        rows=1,
+                        placeholder="enter article names, one per line or separated by |, or Category:Name",
                     ),
                     dbc.Button(
                         "search", id=ids.SEARCH_BUTTON
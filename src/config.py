@@ -0,0 +1,62 @@
+import os
+from src.constants import urls
+
+DATA_DIR = os.environ.get("EDIT_WARS_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data"))
+STORE_PATH = os.environ.get("EDIT_WARS_STORE_PATH", os.path.join(DATA_DIR, "revisions.sqlite3"))
+
+API_URL = os.environ.get("EDIT_WARS_API_URL", urls.WIKIMEDIA_BASE_URL)
+USER_AGENT = os.environ.get("EDIT_WARS_USER_AGENT", "edit_wars/1.0 (https://github.com/sammanadh/edit_wars)")
+HTTP_POOL_SIZE = int(os.environ.get("EDIT_WARS_HTTP_POOL_SIZE", "16"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("EDIT_WARS_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.environ.get("EDIT_WARS_HTTP_READ_TIMEOUT", "30"))
+HTTP_MAX_CONCURRENCY = int(os.environ.get("EDIT_WARS_HTTP_MAX_CONCURRENCY", "8"))
+# Requests per second and burst size per worker process, 0 turns the limit off.
+# The rate is halved when the API asks to back off and recovers gradually.
+API_RATE_LIMIT = float(os.environ.get("EDIT_WARS_API_RATE_LIMIT", "20"))
+API_BURST = int(os.environ.get("EDIT_WARS_API_BURST", "20"))
+# Seconds of replication lag beyond which the API asks clients to retry later
+API_MAXLAG = int(os.environ.get("EDIT_WARS_API_MAXLAG", "5"))
+API_MAX_RETRIES = int(os.environ.get("EDIT_WARS_API_MAX_RETRIES", "4"))
+API_RETRY_BASE = float(os.environ.get("EDIT_WARS_API_RETRY_BASE", "0.5"))
+# Longest Retry-After the client honours, longer ones are cut to this
+API_MAX_RETRY_AFTER = float(os.environ.get("EDIT_WARS_API_MAX_RETRY_AFTER", "30"))
+
+CACHE_MAX_ENTRIES = int(os.environ.get("EDIT_WARS_CACHE_MAX_ENTRIES", "512"))
+CACHE_MAX_BYTES = int(os.environ.get("EDIT_WARS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_TTL = float(os.environ.get("EDIT_WARS_CACHE_TTL", "3600"))
+
+FORECAST_WORKERS = int(os.environ.get("EDIT_WARS_FORECAST_WORKERS", "2"))
+FORECAST_POLL_INTERVAL_MS = int(os.environ.get("EDIT_WARS_FORECAST_POLL_INTERVAL_MS", "1000"))
+FORECAST_ENGINE = os.environ.get("EDIT_WARS_FORECAST_ENGINE", "prophet")
+
+SYNC_WORKERS = int(os.environ.get("EDIT_WARS_SYNC_WORKERS", "4"))
+SYNC_POLL_INTERVAL_MS = int(os.environ.get("EDIT_WARS_SYNC_POLL_INTERVAL_MS", "1000"))
+
+# Contributors and articles linked from a rendered page are fetched ahead of a
+# click by this many background threads, 0 turns it off. Their API requests
+# leave PREFETCH_RESERVE_TOKENS of the rate limit's burst to page loads.
+PREFETCH_WORKERS = int(os.environ.get("EDIT_WARS_PREFETCH_WORKERS", "2"))
+PREFETCH_MAX_PENDING = int(os.environ.get("EDIT_WARS_PREFETCH_MAX_PENDING", "100"))
+PREFETCH_RESERVE_TOKENS = int(os.environ.get("EDIT_WARS_PREFETCH_RESERVE_TOKENS", str(API_BURST // 2)))
+# Most memory the contribution counts of one sync take before they are added
+# to the store. Contributions themselves are never held, only their counts.
+CONTRIBUTIONS_BUFFER_BYTES = int(os.environ.get("EDIT_WARS_CONTRIBUTIONS_BUFFER_BYTES", str(16 * 1024 * 1024)))
+
+# Where new edits come from: "" for nowhere, "poll" for list=recentchanges, or
+# the URL of an EventStreams recentchange stream
+LIVE_FEED = os.environ.get("EDIT_WARS_LIVE_FEED", "")
+LIVE_WIKI = os.environ.get("EDIT_WARS_LIVE_WIKI", "enwiki")
+LIVE_POLL_SECONDS = float(os.environ.get("EDIT_WARS_LIVE_POLL_SECONDS", "5"))
+# How often open pages check the store for new edits, 0 turns it off. Off by
+# default without a live feed; set it when the follower runs as its own
+# process (python -m src.live_updates).
+LIVE_REFRESH_INTERVAL_MS = int(os.environ.get("EDIT_WARS_LIVE_REFRESH_INTERVAL_MS", "10000" if LIVE_FEED else "0"))
+
+# Most points a timeline figure is sent with, zooming in re-queries the range
+TIMELINE_MAX_POINTS = int(os.environ.get("EDIT_WARS_TIMELINE_MAX_POINTS", "1000"))
+
+# Load plotting, forecasting and connections in the background when a worker starts
+PREWARM = os.environ.get("EDIT_WARS_PREWARM", "0") == "1"
+
+# JSON lines file with the stage timings of every request, off when empty
+TRACE_LOG = os.environ.get("EDIT_WARS_TRACE_LOG", "")
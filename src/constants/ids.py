@@ -20,3 +20,23 @@ ERROR_MESSAGE = "error-message"
 USERNAME_INPUT = "username-input"
 REMOVE_BUTTON = "remove_button"
 ARTICLE_BUTTON = "article_button"
+FORECAST_CONTAINER = "forecast-container"
+FORECAST_INTERVAL = "forecast-interval"
+FORECAST_JOB = "forecast-job"
+ARTICLE_SYNC_CONTENT = "article-sync-content"
+ARTICLE_SYNC_INTERVAL = "article-sync-interval"
+ARTICLE_SYNC_JOB = "article-sync-job"
+CONTRIBUTOR_SYNC_CONTENT = "contributor-sync-content"
+CONTRIBUTOR_SYNC_INTERVAL = "contributor-sync-interval"
+CONTRIBUTOR_SYNC_JOB = "contributor-sync-job"
+COMPARISON_STORE = "comparison-store"
+ARTICLE_TIMELINE = "article-timeline"
+ARTICLE_TIMELINE_KEY = "article-timeline-key"
+CONTRIBUTOR_TIMELINE_KEY = "contributor-timeline-key"
+ARTICLE_LIVE_INTERVAL = "article-live-interval"
+CONTRIBUTOR_LIVE_INTERVAL = "contributor-live-interval"
+DASHBOARD_LIVE_INTERVAL = "dashboard-live-interval"
+COMPARISON_REVIDS = "comparison-revids"
+ARTICLE_WINDOW = "article-window"
+CONTRIBUTOR_WINDOW = "contributor-window"
+DASHBOARD_CONTENT = "dashboard-content"
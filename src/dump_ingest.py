@@ -0,0 +1,140 @@
+# Bulk loads article histories from a Wikimedia stub-meta-history dump instead
+# of crawling them through the API. The dump is parsed as it is read, one
+# revision at a time, and saved in batches, so memory stays flat however large
+# it is. Sync state ends at the last revision in the dump, and the next sync of
+# an article, or --tail, fetches only the revisions made after it.
+#
+# Contributions are not loaded: a dump shard holds only part of each user's
+# edits, and a sync cursor set from it would hide the rest from later syncs.
+#
+#   python -m src.dump_ingest enwiki-20250101-stub-meta-history1.xml.gz [--titles "Earth|Moon"] [--tail]
+import argparse
+import bz2
+import gzip
+import time
+import xml.etree.ElementTree as ET
+from src import api_client, helpers, metrics, store
+
+BATCH_SIZE = 5000
+PROGRESS_EVERY = 100000
+
+def open_dump(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def _revision(element, tags):
+    # A <revision> in the shape the API returns it. Dumps write sha1 in base 36,
+    # the API in hex, and reverts are found by comparing the two.
+    contributor = element.find(tags["contributor"])
+    user = None
+    if contributor is not None:
+        user = contributor.findtext(tags["username"]) or contributor.findtext(tags["ip"])
+    sha1 = element.findtext(tags["sha1"])
+    text = element.find(tags["text"])
+    size = text.get("bytes") if text is not None else None
+    parentid = element.findtext(tags["parentid"])
+    return {
+        "revid": int(element.findtext(tags["id"])),
+        "parentid": int(parentid) if parentid else None,
+        "user": user,
+        "timestamp": element.findtext(tags["timestamp"]),
+        "sha1": f"{int(sha1, 36):040x}" if sha1 else None,
+        "size": int(size) if size else None,
+    }
+
+def iter_pages(stream, namespaces=(0,)):
+    # (pageid, title, revisions) per page, the revisions in batches of at most
+    # BATCH_SIZE. Every revision is dropped from the tree once it is read.
+    page = pageid = title = namespace = None
+    revisions = []
+    context = ET.iterparse(stream, events=("start", "end"))
+    _, root = next(context)
+    # Tags are compared with the dump's XML namespace, which changes with the
+    # export format version
+    xmlns = root.tag[:root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+    tags = {
+        name: xmlns + name
+        for name in ["page", "title", "ns", "id", "revision", "parentid", "timestamp", "contributor", "username", "ip", "sha1", "text"]
+    }
+    for event, element in context:
+        tag = element.tag
+        if event == "start":
+            if tag == tags["page"]:
+                page, pageid, title, namespace = element, None, None, None
+            continue
+        if tag == tags["revision"]:
+            if namespace in namespaces:
+                revisions.append(_revision(element, tags))
+                if len(revisions) >= BATCH_SIZE:
+                    yield pageid, title, revisions
+                    revisions = []
+            page.remove(element)
+        elif page is None:
+            continue
+        elif tag == tags["title"] and title is None:
+            title = element.text
+        elif tag == tags["ns"] and namespace is None:
+            namespace = int(element.text)
+        elif tag == tags["id"] and pageid is None:
+            pageid = int(element.text)
+        elif tag == tags["page"]:
+            if revisions:
+                yield pageid, title, revisions
+                revisions = []
+            page = None
+            root.clear()
+
+def ingest(stream, titles=None, namespaces=(0,)):
+    titles = {store.page_key(title) for title in titles} if titles else None
+    stats = {"pages": set(), "parsed": 0, "revisions": 0}
+    started = time.perf_counter()
+
+    for _, title, revisions in iter_pages(stream, namespaces):
+        article_key = store.page_key(title)
+        if titles is not None and article_key not in titles:
+            continue
+        metrics.inc("rows_parsed_total", len(revisions), kind="revisions")
+        stats["revisions"] += store.save_revisions(article_key, revisions)
+        stats["pages"].add(article_key)
+
+        stats["parsed"] += len(revisions)
+        if stats["parsed"] // PROGRESS_EVERY != (stats["parsed"] - len(revisions)) // PROGRESS_EVERY:
+            elapsed = time.perf_counter() - started
+            print(f"{stats['parsed']} revisions of {len(stats['pages'])} pages read, {stats['parsed'] / elapsed:,.0f} rows/s")
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+def sync_tails(article_keys):
+    # Revisions made after the dump was taken, resumed from its last revision
+    return api_client.fetch_many(lambda article_key: helpers.ensure_revisions(article_key, None), article_keys)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dump", help="stub-meta-history XML dump, optionally .bz2 or .gz compressed")
+    parser.add_argument("--titles", default="", help="'|' separated articles to load, all of them when empty")
+    parser.add_argument("--namespaces", default="0", help="comma separated namespaces to load")
+    parser.add_argument("--tail", action="store_true", help="fetch the revisions made after the dump from the API")
+    args = parser.parse_args()
+
+    with open_dump(args.dump) as stream:
+        stats = ingest(
+            stream,
+            titles=[title for title in args.titles.split("|") if title],
+            namespaces=tuple(map(int, args.namespaces.split(","))),
+        )
+    print(
+        f"Read {stats['parsed']} revisions of {len(stats['pages'])} pages in {stats['seconds']:.1f}s, "
+        f"{stats['parsed'] / max(stats['seconds'], 1e-9):,.0f} rows/s. Stored {stats['revisions']} new revisions."
+    )
+
+    if args.tail:
+        started = time.perf_counter()
+        sync_tails(sorted(stats["pages"]))
+        print(f"Fetched the revisions after the dump for {len(stats['pages'])} pages in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+from src import metrics, store
+
+# Identity reverts: a revision with the same content hash as one of the
+# REVERT_RADIUS revisions before its parent restores that version and undoes
+# every edit in between. Each revision is looked up once in an index of content
+# hashes, so a history is scanned in a single pass however long it is.
+REVERT_RADIUS = 15
+# Two editors are warring when one reverts the other within this window of
+# having been reverted by them
+WAR_WINDOW = pd.Timedelta(days=7)
+TOP_PAIRS = 10
+WARRING_PAIR_DTYPES = {"Editor": object, "Opponent": object, "Mutual Reverts": np.int64, "Last Clash": object}
+
+def find_reverts(hashes):
+    # Position of every revert, and of the revision whose content it restores.
+    # Grouping the positions by hash gives each revision the previous one with
+    # the same content, hidden hashes (-1) never match.
+    positions = np.arange(len(hashes))
+    previous = pd.Series(positions).groupby(hashes).shift(1, fill_value=-1).to_numpy()
+    depth = positions - previous - 1
+    # A revision identical to its parent is a null edit, not a revert
+    reverts = (hashes >= 0) & (previous >= 0) & (depth >= 1) & (depth <= REVERT_RADIUS)
+    return positions[reverts], previous[reverts]
+
+def revert_events(users, reverts, restored):
+    # One (position of the revert, reverting user, reverted user) row for every
+    # user whose edits a revert undid, other than the reverting user
+    depth = reverts - restored - 1
+    revision = np.repeat(reverts, depth)
+    offset = np.arange(depth.sum()) - np.repeat(np.cumsum(depth) - depth, depth)
+    reverted = users[np.repeat(restored + 1, depth) + offset]
+    events = pd.DataFrame({"revision": revision, "reverter": users[revision], "reverted": reverted})
+    events = events[(events["reverter"] != events["reverted"]) & (events["reverter"] >= 0) & (events["reverted"] >= 0)]
+    return events.drop_duplicates()
+
+def mutual_reverts(events, seconds):
+    # Marks the reverts that answer a revert by the other user of the pair
+    # within WAR_WINDOW. The last revert in each direction is carried forward
+    # within every pair, so no two reverts are compared directly.
+    reverter, reverted = events["reverter"].to_numpy(), events["reverted"].to_numpy()
+    pair = np.minimum(reverter, reverted).astype(np.int64) << 32 | np.maximum(reverter, reverted)
+    forward = reverter < reverted
+    times = seconds[events["revision"].to_numpy()].astype(np.float64)
+    by_pair = pd.DataFrame({
+        "pair": pair,
+        "forward": np.where(forward, times, np.nan),
+        "backward": np.where(forward, np.nan, times),
+    }).groupby("pair")
+    last_forward = by_pair["forward"].ffill().to_numpy()
+    last_backward = by_pair["backward"].ffill().to_numpy()
+    answered = np.where(forward, last_backward, last_forward)
+    return pair, times - answered <= WAR_WINDOW.total_seconds()
+
+def revert_chains(reverts, restored):
+    # Reverts that undo the revert before them continue its chain
+    continues = np.zeros(len(reverts), dtype=bool)
+    continues[1:] = restored[1:] < reverts[:-1]
+    chain = np.cumsum(~continues)
+    return np.bincount(chain)[1:] if len(chain) else np.array([], dtype=np.int64)
+
+@metrics.timed("edit_wars")
+def detect(history):
+    # history is the frame from store.load_revert_history, oldest first
+    users = history["user"].cat.codes.to_numpy().astype(np.int64)
+    names = history["user"].cat.categories
+    seconds = history["timestamp"].astype(np.int64).to_numpy() // 10**9
+    reverts, restored = find_reverts(history["sha1"].to_numpy())
+
+    events = revert_events(users, reverts, restored)
+    pair, mutual = mutual_reverts(events, seconds)
+    # Pairs are weighed by the edits of their less active user, so two
+    # established editors clashing count for more than a drive-by vandal
+    edits = np.bincount(users[users >= 0], minlength=len(names))
+    weight = np.minimum(edits[events["reverter"].to_numpy()], edits[events["reverted"].to_numpy()])
+
+    clashes = pd.DataFrame({
+        "pair": pair[mutual],
+        "time": seconds[events["revision"].to_numpy()][mutual],
+        "weight": weight[mutual],
+    })
+    pairs = clashes.groupby("pair").agg(reverts=("time", "size"), last=("time", "max"), score=("weight", "first"))
+    pairs = pairs.sort_values(["score", "reverts"], ascending=False)
+    # Sumi et al.'s controversy measure: the pair weights without the largest,
+    # times the number of editors involved
+    editors = np.union1d(pairs.index.to_numpy() >> 32, pairs.index.to_numpy() & 0xFFFFFFFF)
+    controversy = int((pairs["score"].sum() - pairs["score"].max()) * len(editors)) if len(pairs) else 0
+
+    top_pairs = pairs.head(TOP_PAIRS)
+    warring_pairs = pd.DataFrame({
+        "Editor": names[top_pairs.index.to_numpy() >> 32],
+        "Opponent": names[top_pairs.index.to_numpy() & 0xFFFFFFFF],
+        "Mutual Reverts": top_pairs["reverts"].to_numpy(),
+        "Last Clash": pd.to_datetime(top_pairs["last"], unit="s").dt.strftime("%Y-%m-%d").to_numpy(),
+    })
+
+    # Weighted mutual reverts summed over the trailing WAR_WINDOW, per day
+    daily = clashes.groupby(clashes["time"] // 86400)["weight"].sum()
+    if len(daily):
+        days = np.arange(daily.index.min(), daily.index.max() + WAR_WINDOW.days)
+        intensity = daily.reindex(days, fill_value=0).rolling(WAR_WINDOW.days, min_periods=1).sum()
+    else:
+        days, intensity = np.array([], dtype=np.int64), pd.Series([], dtype=np.int64)
+    chains = revert_chains(reverts, restored)
+
+    return {
+        "total_edits": len(history),
+        "reverts": len(reverts),
+        "revert_rate": len(reverts) / len(history) if len(history) else 0.0,
+        "mutual_reverts": int(mutual.sum()),
+        "controversy": controversy,
+        "longest_chain": int(chains.max()) if len(chains) else 0,
+        "warring_pairs": warring_pairs,
+        "intensity": pd.DataFrame({
+            "timestamp": pd.to_datetime(days * 86400, unit="s").date,
+            "count": intensity.to_numpy().astype(np.int64),
+        }),
+    }
+
+def to_record(result):
+    # detect()'s result as plain JSON values
+    return {
+        **result,
+        "warring_pairs": result["warring_pairs"].to_dict("list"),
+        "intensity": {
+            "timestamp": [day.isoformat() for day in result["intensity"]["timestamp"]],
+            "count": result["intensity"]["count"].tolist(),
+        },
+    }
+
+def from_record(record):
+    return {
+        **record,
+        "warring_pairs": pd.DataFrame(record["warring_pairs"]).astype(WARRING_PAIR_DTYPES),
+        "intensity": pd.DataFrame({
+            "timestamp": pd.to_datetime(pd.Series(record["intensity"]["timestamp"], dtype=object)).dt.date,
+            "count": np.array(record["intensity"]["count"], dtype=np.int64),
+        }),
+    }
+
+def article_edit_wars(article_key):
+    # Saved with the revision it was detected at, so worker processes and the
+    # precompute command share one detection per stored history
+    sync_state = store.get_sync_state("revisions", article_key)
+    if sync_state is None:
+        return None
+    saved = store.load_edit_wars(article_key, sync_state[1])
+    if saved is not None:
+        return from_record(saved)
+
+    history = store.load_revert_history(article_key)
+    if history.empty:
+        return None
+    result = detect(history)
+    store.save_edit_wars(article_key, sync_state[1], to_record(result))
+    return result
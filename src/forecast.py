@@ -0,0 +1,187 @@
+import threading
+import time
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from src import config, metrics, store
+
+# Finished jobs are kept around so that every poller of a job sees its result
+MAX_FINISHED_JOBS = 256
+FORECAST_PERIODS = 12
+HISTORY_PERIODS = 24
+# Same coverage as Prophet's default interval_width of 0.8
+INTERVAL_Z = 1.2816
+
+_executor = None
+_jobs = OrderedDict()
+_lock = threading.Lock()
+
+class IncompleteHistoryError(Exception):
+    pass
+
+def monthly_counts(timestamps):
+    df_forecast = timestamps.to_frame("timestamp").resample('MS', on='timestamp').size().reset_index(name='y')  # 'MS' = Month Start
+    df_forecast.columns = ['ds', 'y']
+
+    # Removing timezone
+    df_forecast['ds'] = df_forecast['ds'].dt.tz_localize(None)
+    return df_forecast
+
+def last_complete_month(today=None):
+    today = pd.Timestamp(today or datetime.today())
+    return (today.to_period("M") - 1).to_timestamp()
+
+def future_months(month, periods=FORECAST_PERIODS):
+    return pd.date_range(start=month + pd.offsets.MonthBegin(1), periods=periods, freq='MS')
+
+def fit_prophet(df_forecast, future, init=None):
+    from prophet import Prophet
+
+    model = None
+    # Warm-start from last month's parameters when the model shape still matches
+    if init is not None:
+        try:
+            model = Prophet()
+            model.fit(df_forecast, init={name: np.asarray(value) if isinstance(value, list) else value for name, value in init.items()})
+        except Exception as e:
+            print(f"Warm-started forecast failed, refitting from scratch: {e}")
+            model = None
+    if model is None:
+        model = Prophet()
+        model.fit(df_forecast)
+
+    future_forecast = model.predict(pd.DataFrame({'ds': future}))
+
+    # Fitted parameters in the shape Prophet.fit(init=...) expects
+    params = {name: float(model.params[name][0][0]) for name in ["k", "m", "sigma_obs"]}
+    for name in ["delta", "beta"]:
+        params[name] = model.params[name][0].tolist()
+
+    return params, future_forecast[["yhat", "yhat_lower", "yhat_upper"]].to_numpy()
+
+def fit_numpy(df_forecast, future, init=None):
+    # Least-squares linear trend plus month-of-year offsets once there are two
+    # full years of history, with a normal band from the residuals
+    y = df_forecast["y"].to_numpy(dtype=float)
+    t = np.arange(len(y), dtype=float)
+    t_future = np.arange(len(y), len(y) + len(future), dtype=float)
+
+    def design(t, months):
+        columns = [np.ones_like(t), t]
+        if len(y) >= 24:
+            columns.extend((months == month).astype(float) for month in range(2, 13))
+        return np.column_stack(columns)
+
+    X = design(t, df_forecast["ds"].dt.month.to_numpy())
+    X_future = design(t_future, future.month.to_numpy())
+    coef, *_ = np.linalg.lstsq(X, y, rcond=None)
+
+    residuals = y - X @ coef
+    dof = max(len(y) - X.shape[1], 1)
+    sigma = np.sqrt(residuals @ residuals / dof)
+
+    yhat = X_future @ coef
+    band = INTERVAL_Z * sigma
+    predictions = np.column_stack([yhat, yhat - band, yhat + band]).clip(min=0)
+    return {"coef": coef.tolist(), "sigma": float(sigma)}, predictions
+
+ENGINES = {
+    "prophet": fit_prophet,
+    "numpy": fit_numpy,
+}
+
+# Engines cheap enough to fit inside the request instead of the process pool
+INLINE_ENGINES = {"numpy"}
+
+def get_cached_forecast(article_key, month, engine=None):
+    engine = engine or config.FORECAST_ENGINE
+    cached = store.load_forecast(article_key, engine)
+    if cached is not None and cached["month"] == month.strftime("%Y-%m-%d"):
+        return cached["predictions"]
+    return None
+
+def is_complete(article_key, last_revid):
+    # Forecasts are stored by month alone, so one fitted to a partial history
+    # would be served as the month's forecast until the next month
+    sync_state = store.get_sync_state("revisions", article_key)
+    return last_revid is not None and sync_state is not None and sync_state[1] == last_revid
+
+def compute_forecast(article_key, last_revid, month, df_forecast, engine=None):
+    engine = engine or config.FORECAST_ENGINE
+    if not is_complete(article_key, last_revid):
+        raise IncompleteHistoryError(f"History of {article_key} is not synced up to revision {last_revid}")
+
+    # The current month is still incomplete, so the fit only changes once a month
+    df_forecast = df_forecast[df_forecast["ds"] <= month]
+    future = future_months(month)
+
+    previous = store.load_forecast(article_key, engine)
+    with metrics.stage(f"forecast_{engine}"):
+        params, predictions = ENGINES[engine](df_forecast, future, init=previous["params"] if previous else None)
+
+    history = df_forecast.tail(HISTORY_PERIODS)
+    result = {
+        "history": {
+            "ds": history["ds"].dt.strftime("%Y-%m-%d").tolist(),
+            "y": history["y"].tolist(),
+        },
+        "ds": future.strftime("%Y-%m-%d").tolist(),
+        "yhat": predictions[:, 0].tolist(),
+        "yhat_lower": predictions[:, 1].tolist(),
+        "yhat_upper": predictions[:, 2].tolist(),
+    }
+    store.save_forecast(article_key, engine, month.strftime("%Y-%m-%d"), params, result)
+    return result
+
+def _load_engine(engine):
+    # Runs when a worker process starts, so its first fit doesn't pay for the import
+    if engine == "prophet":
+        import prophet  # noqa: F401
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=config.FORECAST_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_engine,
+            initargs=(config.FORECAST_ENGINE,),
+        )
+    return _executor
+
+def start_workers():
+    # Worker processes are only spawned once a job is submitted
+    return get_executor().submit(_load_engine, config.FORECAST_ENGINE)
+
+def job_key(article_key, month):
+    return f"{config.FORECAST_ENGINE}|{article_key}|{month.strftime('%Y-%m-%d')}"
+
+def submit(article_key, last_revid, month, df_forecast):
+    # Concurrent requests for the same article and month share one fit. Returns
+    # None without submitting while the history is still partial.
+    if not is_complete(article_key, last_revid):
+        return None
+    key = job_key(article_key, month)
+    with _lock:
+        future = _jobs.get(key)
+        if future is None:
+            future = get_executor().submit(compute_forecast, article_key, last_revid, month, df_forecast, config.FORECAST_ENGINE)
+            started = time.monotonic()
+            future.add_done_callback(
+                lambda _: metrics.observe("forecast_job_seconds", time.monotonic() - started, engine=config.FORECAST_ENGINE)
+            )
+            _jobs[key] = future
+            _evict_finished()
+        return future
+
+def get_job(key):
+    with _lock:
+        return _jobs.get(key)
+
+def _evict_finished():
+    finished = [key for key, future in _jobs.items() if future.done()]
+    for key in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[key]
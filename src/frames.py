@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Revision ids are still far below 2**32, so they fit in four bytes unsigned
+ID_DTYPE = np.uint32
+
+REVISION_DTYPES = {
+    "revid": ID_DTYPE,
+    "parentid": ID_DTYPE,
+    "user": "category",
+    "timestamp": "epoch",
+}
+
+# What revert detection reads. The content hash is kept as the integer value of
+# its first 15 hex digits, -1 where the API hides it.
+REVERT_DTYPES = {
+    "timestamp": "epoch",
+    "user": "category",
+    "sha1": "hash",
+}
+
+# A time window of revisions, read by both the details page aggregates and
+# revert detection
+WINDOW_DTYPES = {**REVISION_DTYPES, "sha1": "hash"}
+
+def parse_timestamps(timestamps):
+    # API timestamps ("2024-01-31T12:00:00Z") as int64 seconds since the epoch.
+    # NumPy parses the ISO form without the trailing Z far faster than strptime.
+    return np.array([timestamp[:-1] for timestamp in timestamps], dtype="datetime64[s]").astype(np.int64)
+
+def hash_values(values, count):
+    return np.fromiter((int(value[:15], 16) if value else -1 for value in values), dtype=np.int64, count=count)
+
+def page_columns(rows, dtypes):
+    # One API page (or one store chunk) of rows as typed column arrays
+    columns = {}
+    for name, dtype in dtypes.items():
+        if dtype == "category":
+            columns[name] = pd.Categorical([row.get(name) for row in rows])
+        elif dtype == "epoch":
+            columns[name] = parse_timestamps([row[name] for row in rows])
+        elif dtype == "hash":
+            columns[name] = hash_values((row.get(name) for row in rows), len(rows))
+        else:
+            columns[name] = np.fromiter((row.get(name) or 0 for row in rows), dtype=dtype, count=len(rows))
+    return columns
+
+def tuple_columns(rows, dtypes):
+    # Rows read back from the store, in dtypes order with epoch timestamps
+    columns = {}
+    for (name, dtype), values in zip(dtypes.items(), zip(*rows)):
+        if dtype == "category":
+            columns[name] = pd.Categorical(values)
+        elif dtype == "epoch":
+            columns[name] = np.fromiter(values, dtype=np.int64, count=len(rows))
+        elif dtype == "hash":
+            columns[name] = hash_values(values, len(rows))
+        else:
+            columns[name] = np.fromiter((value or 0 for value in values), dtype=dtype, count=len(rows))
+    return columns
+
+def build_frame(chunks, dtypes):
+    data = {}
+    for name, dtype in dtypes.items():
+        parts = [chunk[name] for chunk in chunks]
+        if dtype == "category":
+            data[name] = union_categoricals(parts) if parts else pd.Categorical([])
+        elif dtype == "epoch":
+            seconds = np.concatenate(parts) if parts else np.array([], dtype=np.int64)
+            data[name] = pd.to_datetime(seconds, unit="s", utc=True)
+        elif dtype == "hash":
+            data[name] = np.concatenate(parts) if parts else np.array([], dtype=np.int64)
+        else:
+            data[name] = np.concatenate(parts) if parts else np.array([], dtype=dtype)
+    return pd.DataFrame(data)
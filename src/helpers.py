@@ -1,98 +1,342 @@
-import pandas as pd
+import threading
 from src.constants import urls
-import requests
+from src import store, api_client, config, aggregates, co_editors, edit_wars, frames, metrics
+from src.cache import revision_cache
 from datetime import datetime
 
-API_URL = "https://en.wikipedia.org/w/api.php"
+API_URL = config.API_URL
+# Most titles the API accepts in one query
+API_TITLES_LIMIT = 50
 
-def fetch_contributor_data(username):
+# The on_page callbacks of every caller waiting on a sync, by flight key
+_page_listeners = {}
+_page_listeners_lock = threading.Lock()
+
+def get_last_contribution_revid(username):
     try:
-        url = API_URL
-        params = {
+        data = api_client.get({
             "action": "query",
             "list": "usercontribs",
             "ucuser": username,
-            "uclimit": "max",
-            "ucprop": "title|timestamp|ids",
-            "format": "json",
-        }
+            "uclimit": 1,
+            "ucprop": "ids",
+        })
+        contribs = data["query"]["usercontribs"]
+        return contribs[0]["revid"] if contribs else None
+    except api_client.APIError as e:
+        print(f"Error fetching latest contribution for {username}: {e}")
+        return None
 
-        contribs = []
+def is_synced(kind, key, last_revid):
+    sync_state = store.get_sync_state(kind, key)
+    return sync_state is not None and last_revid is not None and sync_state[1] == last_revid
 
-        while True:
-            response = requests.get(url, params=params).json()
-            contribs = response["query"]["usercontribs"]
-            if not contribs:
-                break
-            contribs.extend(contribs)
+def shared_sync(key, sync, on_page):
+    # Runs sync(on_page) as a single flight. Callers that join a running sync
+    # get the pages fetched after they joined, not just the caller leading it.
+    with _page_listeners_lock:
+        listeners = _page_listeners.setdefault(key, [])
+        if on_page:
+            listeners.append(on_page)
 
-            if "continue" in response:
-                params["uccontinue"] = response["continue"]["uccontinue"]
-            else:
-                break
+    def notify(rows):
+        with _page_listeners_lock:
+            current = list(_page_listeners.get(key, ()))
+        for listener in current:
+            listener(rows)
+
+    try:
+        return api_client.single_flight(key, lambda: sync(notify))
+    finally:
+        with _page_listeners_lock:
+            if on_page:
+                listeners.remove(on_page)
+            if not listeners and _page_listeners.get(key) is listeners:
+                del _page_listeners[key]
 
+def sync_contributions(username, last_revid=None, on_page=None):
+    # Concurrent syncs of the same user share one crawl
+    return shared_sync(
+        ("sync_contributions", username),
+        lambda notify: _sync_contributions(username, last_revid, notify),
+        on_page,
+    )
+
+def contribution_pages(username, start=None, end=None):
+    # The user's contributions between two ISO timestamps, either open, oldest
+    # first, one API page at a time
+    params = {
+        "list": "usercontribs",
+        "ucuser": username,
+        "uclimit": "max",
+        "ucprop": api_client.CONTRIBUTION_PROPS,
+        "ucdir": "newer",
+    }
+    if start:
+        params["ucstart"] = start
+    if end:
+        params["ucend"] = end
+
+    for response in api_client.iter_query(params):
+        contribs = response["query"]["usercontribs"]
         if not contribs:
-            return None
+            break
+        metrics.inc("rows_parsed_total", len(contribs), kind="contributions")
+        yield contribs
 
-        df = pd.DataFrame(contribs)
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        return df
+@metrics.timed("sync_contributions")
+def _sync_contributions(username, last_revid, on_page):
+    sync_state = store.get_sync_state("contributions", username)
+    if sync_state and last_revid is not None and sync_state[1] == last_revid:
+        return
 
-    except Exception as e:
+    # Contributions are counted into the aggregate index as the pages arrive
+    # and never stored, so bots with millions of them take no more memory
+    # than the counts. Only pull contributions newer than what is counted.
+    counts = aggregates.ContributionCounts(username, sync_state)
+    for contribs in contribution_pages(username, start=sync_state[0] if sync_state else None):
+        metrics.inc("rows_stored_total", counts.add(contribs), kind="contributions")
+        if on_page:
+            on_page(len(contribs))
+        if counts.due() and not counts.flush():
+            # Another process is syncing the same user
+            return
+    counts.flush()
+
+def ensure_contributions(username, last_revid):
+    try:
+        sync_contributions(username, last_revid)
+    except api_client.APIError as e:
         print(f"Error fetching contributor data: {e}")
+    return store.get_sync_state("contributions", username) is not None
+
+def count_contribution_window(username, start, end, last_revid):
+    # Contributions are only counted by day, hour and article over the whole
+    # history, so a window is answered from the store only when it spans all
+    # of it. Otherwise just the window is fetched and counted.
+    sync_state = store.get_sync_state("contributions", username)
+    if sync_state is not None and sync_state[1] == last_revid and (end is None or end >= sync_state[0]):
+        start_day = None if start is None else window_epochs(start, None)[0] // 86400
+        if start_day is None or not store.load_daily("contributions", username, None, start_day - 1):
+            return aggregates.contributor_aggregates(username)
+
+    counts = aggregates.ContributionCounts(username, None)
+    try:
+        for contribs in contribution_pages(username, start, end):
+            counts.add(contribs)
+    except api_client.APIError as e:
+        print(f"Error fetching contributions of {username} between {start} and {end}: {e}")
         return None
+    return aggregates.contributor_window_aggregates(counts)
+
+def get_contribution_window(username, start, end, last_revid):
+    return revision_cache.get_or_compute(
+        "contribution_window", (username, start, end), last_revid,
+        lambda: count_contribution_window(username, start, end, last_revid),
+    )
 
-def fetch_all_revisions(article_name):
+def fetch_contributor_data(username, start=None, end=None):
+    # The user's aggregates, over the window between two ISO timestamps when given
+    username = store.page_key(username)
+    last_revid = get_last_contribution_revid(username)
+    if start is None and end is None:
+        return get_contributor_aggregates(username, last_revid)
+    return get_contribution_window(username, start, end, last_revid)
+
+def get_last_revid(article_name):
     try:
-        url = API_URL
-        params = {
-            "action": "query",
-            "format": "json",
-            "prop": "revisions",
-            "titles": article_name,
-            "rvprop": "timestamp|user|ids",
-            "rvlimit": "max"
-        }
-
-        all_revisions = []
-        while True:
-            response = requests.get(url, params = params)
-            response.raise_for_status() 
-            data = response.json()
-
-            page = list(data["query"]["pages"].values())[0]
-            if "revisions" not in page:
+        data = api_client.get({"action": "query", "prop": "info", "titles": article_name})
+        return data["query"]["pages"][0].get("lastrevid")
+    except api_client.APIError as e:
+        print(f"Error fetching page info for {article_name}: {e}")
+        return None
+
+def _get_last_revids_batch(article_names):
+    try:
+        data = api_client.get({"action": "query", "prop": "info", "titles": "|".join(article_names)})
+    except api_client.APIError as e:
+        print(f"Error fetching page info for {len(article_names)} articles: {e}")
+        return {}
+    # Pages come back under their normalized titles, e.g. with a capitalized first letter
+    requested = {item["to"]: item["from"] for item in data["query"].get("normalized", [])}
+    return {requested.get(page["title"], page["title"]): page.get("lastrevid") for page in data["query"]["pages"]}
+
+def get_last_revids(article_names):
+    article_names = list(dict.fromkeys(article_names))
+    batches = [
+        tuple(article_names[start:start + API_TITLES_LIMIT])
+        for start in range(0, len(article_names), API_TITLES_LIMIT)
+    ]
+    last_revids = {}
+    for batch_revids in api_client.fetch_many(_get_last_revids_batch, batches).values():
+        last_revids.update(batch_revids)
+    return {article_name: last_revids.get(article_name) for article_name in article_names}
+
+def get_category_articles(category, limit):
+    category = category if category.startswith("Category:") else f"Category:{category}"
+    article_names = []
+    try:
+        params = {"list": "categorymembers", "cmtitle": category, "cmnamespace": 0, "cmlimit": min(limit, 500)}
+        for data in api_client.iter_query(params):
+            article_names.extend(member["title"] for member in data["query"]["categorymembers"])
+            if len(article_names) >= limit:
                 break
+    except api_client.APIError as e:
+        print(f"Error fetching members of {category}: {e}")
+    return article_names[:limit]
 
-            all_revisions.extend(page["revisions"])
-
-            if "continue" in data:
-                params["rvcontinue"] = data["continue"]["rvcontinue"]
-            else:
-                break 
-        
-        revisions_df = pd.DataFrame(all_revisions)
-        return revisions_df
-    
-    except Exception as e:
+def sync_revisions(article_name, last_revid=None, on_page=None):
+    # Concurrent syncs of the same article share one crawl
+    return shared_sync(
+        ("sync_revisions", article_name),
+        lambda notify: _sync_revisions(article_name, last_revid, notify),
+        on_page,
+    )
+
+@metrics.timed("sync_revisions")
+def _sync_revisions(article_name, last_revid, on_page):
+    # Revisions are crawled oldest first, so the stored history is always
+    # a contiguous prefix and the next sync can resume from its newest entry
+    sync_state = store.get_sync_state("revisions", article_name)
+    if sync_state and last_revid is not None and sync_state[1] == last_revid:
+        return
+
+    params = {
+        "prop": "revisions",
+        "titles": article_name,
+        "rvprop": api_client.REVISION_PROPS,
+        "rvlimit": "max",
+        "rvdir": "newer",
+    }
+    if sync_state:
+        params["rvstart"] = sync_state[0]
+
+    for data in api_client.iter_query(params):
+        page = data["query"]["pages"][0]
+        if "revisions" not in page:
+            break
+
+        metrics.inc("rows_parsed_total", len(page["revisions"]), kind="revisions")
+        metrics.inc("rows_stored_total", store.save_revisions(article_name, page["revisions"]), kind="revisions")
+        if on_page:
+            on_page(len(page["revisions"]))
+
+def ensure_revisions(article_name, last_revid):
+    try:
+        sync_revisions(article_name, last_revid)
+    except api_client.APIError as e:
         print(f"Error fetching revisions for {article_name}: {e}")
+    return store.get_sync_state("revisions", article_name) is not None
+
+def load_revision_window(article_name, start, end, last_revid):
+    # The stored history is a contiguous prefix, so it answers any window that
+    # ends before its newest revision. Otherwise only the window is fetched,
+    # and not stored, which would leave a gap in the history.
+    sync_state = store.get_sync_state("revisions", article_name)
+    if sync_state is not None and (sync_state[1] == last_revid or (end is not None and sync_state[0] >= end)):
+        return store.load_revision_window(article_name, *window_epochs(start, end))
+
+    params = {
+        "prop": "revisions",
+        "titles": article_name,
+        "rvprop": api_client.REVISION_PROPS,
+        "rvlimit": "max",
+        "rvdir": "newer",
+    }
+    if start:
+        params["rvstart"] = start
+    if end:
+        params["rvend"] = end
+
+    chunks = []
+    try:
+        for data in api_client.iter_query(params):
+            page = data["query"]["pages"][0]
+            if "revisions" not in page:
+                break
+            metrics.inc("rows_parsed_total", len(page["revisions"]), kind="revisions")
+            chunks.append(frames.page_columns(page["revisions"], frames.WINDOW_DTYPES))
+    except api_client.APIError as e:
+        print(f"Error fetching revisions of {article_name} between {start} and {end}: {e}")
         return None
+    return frames.build_frame(chunks, frames.WINDOW_DTYPES)
+
+def get_revision_window(article_name, start, end, last_revid):
+    revisions_df = revision_cache.get_or_compute(
+        "revision_window", (article_name, start, end), last_revid,
+        lambda: load_revision_window(article_name, start, end, last_revid),
+    )
+    return None if revisions_df is None else revisions_df.copy(deep=False)
+
+def get_synced(namespace, kind, key, last_revid, compute):
+    # compute() over the stored history, once it is synced. A sync cut short
+    # by an API error leaves part of the history stored: what it shows is
+    # returned but not cached, so the next call resumes the sync.
+    ensure = ensure_revisions if kind == "revisions" else ensure_contributions
+    return revision_cache.get_or_compute(
+        namespace, key, last_revid,
+        lambda: compute(key) if ensure(key, last_revid) else None,
+        cacheable=lambda _: is_synced(kind, key, last_revid),
+    )
+
+def get_article_aggregates(article_name, last_revid):
+    return get_synced("article_aggregates", "revisions", article_name, last_revid, aggregates.article_aggregates)
+
+def get_contributor_aggregates(username, last_revid):
+    return get_synced("contributor_aggregates", "contributions", username, last_revid, aggregates.contributor_aggregates)
 
-def get_article_stats(article_name):
-    revisions_df = fetch_all_revisions(article_name)
-    revisions_df["timestamp"] = pd.to_datetime(revisions_df["timestamp"])
+def get_edit_wars(article_name, last_revid):
+    return get_synced("edit_wars", "revisions", article_name, last_revid, edit_wars.article_edit_wars)
 
-    total_edits = revisions_df.shape[0]
-    contributors = revisions_df["user"].nunique()
-    last_edit = revisions_df["timestamp"].max().strftime("%Y-%m-%d %H:%M:%S")
+def get_co_editors(article_names, last_revids):
+    # Cached until one of the articles gets new revisions
+    return revision_cache.get_or_compute(
+        "co_editors", tuple(article_names), tuple(last_revids),
+        lambda: co_editors.overlap(article_names),
+    )
+
+@metrics.timed("get_article_stats")
+def get_article_stats(article_name, last_revid=None):
+    key = store.page_key(article_name)
+    if last_revid is None:
+        last_revid = get_last_revid(key)
+    article_aggregates = get_article_aggregates(key, last_revid)
+    if article_aggregates is None:
+        return None
 
     return {
         "Article Name": article_name,
-        "Total Edits": total_edits,
-        "Number of Contributors": contributors,
-        "Last Edit Timestamp": last_edit,
+        "Total Edits": article_aggregates["total_edits"],
+        "Number of Contributors": article_aggregates["total_contributors"],
+        "Last Edit Timestamp": article_aggregates["latest_rev_timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
     }
 
+def get_many_article_stats(article_names):
+    # One info query per 50 titles, then the histories are synced concurrently
+    keys = {article_name: store.page_key(article_name) for article_name in article_names}
+    last_revids = get_last_revids(keys.values())
+    stats = api_client.fetch_many(
+        lambda article_name: get_article_stats(article_name, last_revids[keys[article_name]])
+        if last_revids[keys[article_name]] is not None else None,
+        keys,
+    )
+    return [article_stats for article_stats in stats.values() if article_stats]
+
+def time_window(start_date, end_date):
+    # Dates picked on a details page as the ISO timestamps the API takes, the
+    # whole of both days included. None when no window is picked.
+    if not start_date and not end_date:
+        return None
+    start = f"{start_date[:10]}T00:00:00Z" if start_date else None
+    end = f"{end_date[:10]}T23:59:59Z" if end_date else None
+    return start, end
+
+def window_epochs(start, end):
+    return tuple(None if timestamp is None else int(frames.parse_timestamps([timestamp])[0]) for timestamp in (start, end))
+
 def format_timestamp_readable(iso_timestamp):
-    dt = datetime.fromisoformat(iso_timestamp.replace("Z", "+00:00"))
+    if isinstance(iso_timestamp, str):
+        dt = datetime.fromisoformat(iso_timestamp.replace("Z", "+00:00"))
+    else:
+        dt = iso_timestamp
     return dt.strftime("%B %d, %Y, %I:%M %p")
\ No newline at end of file
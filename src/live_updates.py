@@ -0,0 +1,192 @@
+# Follows the wiki's recent changes and applies the new edits to the articles
+# and users already in the store, so their pages stay current without crawling
+# their histories again. Changes are polled from list=recentchanges, or read
+# from an EventStreams-style server-sent event stream:
+#
+#   python -m src.live_updates [--stream https://stream.wikimedia.org/v2/stream/recentchange]
+#
+# One follower per store is enough; main.py starts one in the development
+# server when EDIT_WARS_LIVE_FEED is set. Open pages poll the store's sync
+# state and re-render once it moves past the revision they show; a follower run
+# on its own needs EDIT_WARS_LIVE_REFRESH_INTERVAL_MS set for the web servers.
+import argparse
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from src import api_client, config, helpers, store
+
+RECENT_CHANGE_PROPS = "title|ids|sizes|user|timestamp|sha1"
+STREAM_BATCH_SECONDS = 2
+
+def from_recent_change(change):
+    # A list=recentchanges entry as the revision it made
+    return {
+        "title": change["title"],
+        "revid": change["revid"],
+        "parentid": change.get("old_revid"),
+        "user": change.get("user"),
+        "timestamp": change["timestamp"],
+        "sha1": change.get("sha1"),
+        "size": change.get("newlen"),
+    }
+
+def from_stream_event(event):
+    # Stream events carry no content hash, so there is no "sha1" key and the
+    # revision is fetched from the API instead of being stored as it is
+    return {
+        "title": event["title"],
+        "revid": event["revision"]["new"],
+        "parentid": event["revision"].get("old"),
+        "user": event.get("user"),
+        "timestamp": datetime.fromtimestamp(event["timestamp"], timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "size": event.get("length", {}).get("new"),
+    }
+
+def poll(interval=None):
+    # Batches of new revisions, every interval seconds. rcstart is inclusive,
+    # so the changes already seen in its second are skipped by rcid.
+    interval = interval or config.LIVE_POLL_SECONDS
+    params = {
+        "list": "recentchanges",
+        "rcprop": RECENT_CHANGE_PROPS,
+        "rctype": "edit|new",
+        "rcnamespace": 0,
+        "rcdir": "newer",
+        "rclimit": "max",
+    }
+    start = (datetime.now(timezone.utc) - timedelta(seconds=interval)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    seen = set()
+    while True:
+        changes = []
+        try:
+            for data in api_client.iter_query({**params, "rcstart": start}):
+                changes.extend(data["query"]["recentchanges"])
+        except api_client.APIError as e:
+            print(f"Error polling recent changes: {e}")
+        new = [change for change in changes if change["rcid"] not in seen]
+        if changes:
+            start = changes[-1]["timestamp"]
+            seen = {change["rcid"] for change in changes if change["timestamp"] == start}
+        yield [from_recent_change(change) for change in new]
+        time.sleep(interval)
+
+def _read_stream(url, wiki, events):
+    # Puts the revisions of the stream's events on the queue, reconnecting
+    # after the last event seen when the connection drops
+    last_event_id = None
+    while True:
+        headers = {"Accept": "text/event-stream"}
+        if last_event_id is not None:
+            headers["Last-Event-ID"] = last_event_id
+        try:
+            with api_client.get_session().get(
+                url, headers=headers, stream=True, timeout=(config.HTTP_CONNECT_TIMEOUT, 60),
+            ) as response:
+                response.raise_for_status()
+                event_id, data = None, []
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("id:"):
+                        event_id = line[3:].strip()
+                    elif line.startswith("data:"):
+                        data.append(line[5:].strip())
+                    elif not line and data:
+                        last_event_id, payload, data = event_id, "\n".join(data), []
+                        try:
+                            event = json.loads(payload)
+                            if event.get("wiki") == wiki and event.get("type") in ("edit", "new") and event.get("namespace") == 0:
+                                events.put(from_stream_event(event))
+                        except (ValueError, KeyError, TypeError, AttributeError) as e:
+                            print(f"Skipping malformed recent changes event {event_id}: {e!r}")
+        except Exception as e:
+            # Anything else ends this connection, never the reader, which
+            # stream() waits on
+            print(f"Recent changes stream interrupted, reconnecting: {e!r}")
+            time.sleep(config.LIVE_POLL_SECONDS)
+
+def stream(url, wiki=None):
+    # Batches of new revisions from a server-sent event stream, every
+    # STREAM_BATCH_SECONDS
+    events = queue.Queue()
+    threading.Thread(
+        target=_read_stream, args=(url, wiki or config.LIVE_WIKI, events), name="live-stream", daemon=True,
+    ).start()
+    while True:
+        batch = [events.get()]
+        deadline = time.monotonic() + STREAM_BATCH_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                batch.append(events.get(timeout=remaining))
+            except queue.Empty:
+                break
+        yield batch
+
+def _contiguous(revisions, last_revid):
+    return all(revision["parentid"] == parent for revision, parent in zip(
+        revisions, [last_revid] + [revision["revid"] for revision in revisions[:-1]],
+    ))
+
+def apply_changes(revisions):
+    # Revisions that directly follow what is stored are saved as they are. The
+    # others, after a gap or without a content hash, are synced from the API,
+    # which resumes after the stored revisions. Either way the work is in
+    # proportion to the new edits.
+    articles = store.get_sync_revids("revisions", {store.page_key(revision["title"]) for revision in revisions})
+    users = store.get_sync_revids(
+        "contributions", {store.page_key(revision["user"]) for revision in revisions if revision.get("user")},
+    )
+    by_article = {}
+    for revision in revisions:
+        article_key = store.page_key(revision["title"])
+        if article_key in articles:
+            by_article.setdefault(article_key, []).append(revision)
+
+    saved, resync = 0, []
+    for article_key, article_revisions in by_article.items():
+        article_revisions.sort(key=lambda revision: revision["revid"])
+        if all("sha1" in revision for revision in article_revisions) and _contiguous(article_revisions, articles[article_key]):
+            saved += store.save_revisions(article_key, article_revisions)
+        else:
+            resync.append(article_key)
+    api_client.fetch_many(lambda article_key: helpers.ensure_revisions(article_key, None), resync)
+
+    # A user's previous contribution isn't part of the change, so their
+    # contributions are always synced from the API
+    changed_users = {store.page_key(revision["user"]) for revision in revisions if revision.get("user")} & users.keys()
+    api_client.fetch_many(lambda username: helpers.ensure_contributions(username, None), changed_users)
+    return {"articles": len(by_article), "saved": saved, "synced": len(resync), "users": len(changed_users)}
+
+def follow(feed=None):
+    feed = feed or config.LIVE_FEED
+    changes = poll() if feed == "poll" else stream(feed)
+    for revisions in changes:
+        if not revisions:
+            continue
+        started = time.perf_counter()
+        try:
+            applied = apply_changes(revisions)
+        except Exception as e:
+            # e.g. the store stayed locked past its timeout. Articles this batch
+            # missed are synced by their next change or page load.
+            print(f"Error applying {len(revisions)} recent changes: {e!r}")
+            continue
+        if applied["articles"] or applied["users"]:
+            print(
+                f"{len(revisions)} recent changes: {applied['saved']} revisions saved to {applied['articles']} articles, "
+                f"{applied['synced']} articles and {applied['users']} users synced in {time.perf_counter() - started:.2f}s"
+            )
+
+def start():
+    threading.Thread(target=follow, name="live-updates", daemon=True).start()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stream", help="EventStreams recentchange URL to read instead of polling the API")
+    parser.add_argument("--interval", type=float, default=config.LIVE_POLL_SECONDS, help="seconds between polls")
+    args = parser.parse_args()
+    config.LIVE_POLL_SECONDS = args.interval
+    follow(args.stream or "poll")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from flask import Response, g, request
+from src import config
+from src.cache import revision_cache
+
+# Counters, gauges and histograms in the Prometheus text format, served on /metrics.
+# Every worker process keeps its own, so a scrape sees the worker it reached.
+
+PREFIX = "edit_wars_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICS = {
+    "api_requests_total": ("counter", "MediaWiki API round trips by query and outcome"),
+    "api_request_seconds": ("histogram", "MediaWiki API round trip time by query"),
+    "api_response_bytes_total": ("counter", "Bytes of MediaWiki API response bodies by query"),
+    "rows_parsed_total": ("counter", "Revisions and contributions parsed from API responses"),
+    "rows_stored_total": ("counter", "Revisions and contributions newly added to the store"),
+    "stage_seconds": ("histogram", "Time spent in each stage of the helpers and page callbacks"),
+    "request_seconds": ("histogram", "Time to answer a request, by Dash callback output or route"),
+    "first_paint_seconds": ("histogram", "Time from a page load until it first showed real data"),
+    "forecast_job_seconds": ("histogram", "Time from submitting a forecast job until it finished"),
+    "api_retries_total": ("counter", "MediaWiki API requests retried after an error, 429 or maxlag"),
+    "api_coalesced_total": ("counter", "Calls that waited for an identical call already in flight"),
+    "api_queue_depth": ("gauge", "Requests waiting for the MediaWiki API rate limit"),
+    "api_rate_limit": ("gauge", "Current MediaWiki API request rate limit per second"),
+    "prefetch_total": ("counter", "Linked contributors and articles fetched ahead of a click, by outcome"),
+}
+
+_lock = threading.Lock()
+_series = {name: {} for name in METRICS}
+# Stages recorded during the current request, when the trace log is enabled
+_trace = ContextVar("trace", default=None)
+
+def inc(name, value=1, **labels):
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        _series[name][key] = _series[name].get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        _series[name][key] = value
+
+def observe(name, value, **labels):
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        histogram = _series[name].get(key)
+        if histogram is None:
+            # Per-bucket counts with a final +Inf bucket, then sum and count
+            histogram = _series[name][key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        histogram[0][bisect.bisect_left(BUCKETS, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("stage_seconds", elapsed, stage=name)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append({"stage": name, "ms": round(elapsed * 1000, 2)})
+
+def timed(name):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(key, **extra):
+    items = list(key) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+def _cache_lines():
+    stats = revision_cache.stats()
+    lines = []
+    for name, kind, help_text, values in [
+        ("cache_hits_total", "counter", "Revision cache hits by namespace", stats["hits"]),
+        ("cache_misses_total", "counter", "Revision cache misses by namespace", stats["misses"]),
+    ]:
+        lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} {kind}"]
+        lines += [f"{PREFIX}{name}{_labels((('namespace', namespace),))} {value}" for namespace, value in values.items()]
+    for name, kind, help_text, value in [
+        ("cache_evictions_total", "counter", "Revision cache evictions", stats["evictions"]),
+        ("cache_entries", "gauge", "Entries in the revision cache", stats["entries"]),
+        ("cache_bytes", "gauge", "Estimated size of the revision cache", stats["bytes"]),
+    ]:
+        lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} {kind}", f"{PREFIX}{name} {value}"]
+    return lines
+
+def render():
+    lines = []
+    with _lock:
+        for name, (kind, help_text) in METRICS.items():
+            lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} {kind}"]
+            for key, value in _series[name].items():
+                if kind != "histogram":
+                    lines.append(f"{PREFIX}{name}{_labels(key)} {value}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{PREFIX}{name}_bucket{_labels(key, le=bound)} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{_labels(key)} {total}")
+                lines.append(f"{PREFIX}{name}_count{_labels(key)} {count}")
+    return "\n".join(lines + _cache_lines()) + "\n"
+
+def _handler():
+    if request.path == "/_dash-update-component":
+        body = request.get_json(silent=True) or {}
+        return body.get("output", "unknown")
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    _trace.set([] if config.TRACE_LOG else None)
+
+def _after_request(response):
+    if "metrics_started" not in g:
+        return response
+    elapsed = time.perf_counter() - g.metrics_started
+    handler = _handler()
+    observe("request_seconds", elapsed, handler=handler)
+
+    trace = _trace.get()
+    if trace is not None:
+        # The time not covered by any stage went to Dash's dispatch and the
+        # JSON serialization of the callback output
+        entry = {
+            "time": time.time(), "pid": os.getpid(), "handler": handler,
+            "status": response.status_code, "ms": round(elapsed * 1000, 2), "stages": trace,
+        }
+        with _lock, open(config.TRACE_LOG, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        _trace.set(None)
+    return response
+
+def register(server):
+    server.before_request(_before_request)
+    server.after_request(_after_request)
+    server.add_url_rule(
+        "/metrics", "metrics",
+        lambda: Response(render(), mimetype="text/plain; version=0.0.4"),
+    )
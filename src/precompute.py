@@ -0,0 +1,125 @@
+# Precomputes what the details pages show for a watchlist of articles and
+# users, so their first view of the day is answered from the store. Histories
+# are synced, which keeps the aggregate index current, and every article gets
+# its edit wars detected and this month's forecast fitted and saved, in a pool
+# of worker processes.
+#
+#   python -m src.precompute watchlist.txt [--processes 4] [--engine prophet]
+#
+# The watchlist holds one article per line, users prefixed with "User:", and
+# "#" starts a comment. Entries already at their latest revision, with their
+# edit wars and this month's forecast saved, are skipped, so an interrupted run picks up where it
+# stopped when started again.
+import argparse
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src import config, forecast, helpers, store
+
+USER_PREFIX = "User:"
+
+def read_watchlist(path):
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith(USER_PREFIX):
+                entries.append(("user", store.page_key(line[len(USER_PREFIX):])))
+            else:
+                entries.append(("article", store.page_key(line)))
+    return list(dict.fromkeys(entries))
+
+def precompute_article(article_key, engine):
+    timings = {"sync": 0.0, "edit_wars": 0.0, "forecast": 0.0}
+    last_revid = helpers.get_last_revid(article_key)
+    if last_revid is None:
+        return "missing", 0, timings
+
+    month = forecast.last_complete_month()
+    synced = helpers.is_synced("revisions", article_key, last_revid)
+    if (
+        synced
+        and store.load_edit_wars(article_key, last_revid) is not None
+        and forecast.get_cached_forecast(article_key, month, engine) is not None
+    ):
+        return "up to date", 0, timings
+
+    started = time.perf_counter()
+    rows = []
+    if not synced:
+        helpers.sync_revisions(article_key, last_revid, on_page=rows.append)
+    aggregates = helpers.get_article_aggregates(article_key, last_revid)
+    timings["sync"] = time.perf_counter() - started
+    if aggregates is None:
+        return "missing", sum(rows), timings
+
+    started = time.perf_counter()
+    helpers.get_edit_wars(article_key, last_revid)
+    timings["edit_wars"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if forecast.get_cached_forecast(article_key, month, engine) is None:
+        forecast.compute_forecast(article_key, last_revid, month, aggregates["monthly"], engine)
+    timings["forecast"] = time.perf_counter() - started
+    return "done", sum(rows), timings
+
+def precompute_user(username, engine):
+    timings = {"sync": 0.0, "edit_wars": 0.0, "forecast": 0.0}
+    last_revid = helpers.get_last_contribution_revid(username)
+    if last_revid is None:
+        return "missing", 0, timings
+    if helpers.is_synced("contributions", username, last_revid):
+        return "up to date", 0, timings
+
+    started = time.perf_counter()
+    rows = []
+    helpers.sync_contributions(username, last_revid, on_page=rows.append)
+    helpers.get_contributor_aggregates(username, last_revid)
+    timings["sync"] = time.perf_counter() - started
+    return "done", sum(rows), timings
+
+PRECOMPUTE = {
+    "article": precompute_article,
+    "user": precompute_user,
+}
+
+def run(kind, key, engine):
+    started = time.perf_counter()
+    try:
+        status, rows, timings = PRECOMPUTE[kind](key, engine)
+    except Exception as e:
+        status, rows, timings = f"failed: {e}", 0, {"sync": 0.0, "edit_wars": 0.0, "forecast": 0.0}
+    return status, rows, timings, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("watchlist", help="file with one article per line, users prefixed with 'User:'")
+    parser.add_argument("--processes", type=int, default=4, help="worker processes, each within its own API rate limit")
+    parser.add_argument("--engine", default=config.FORECAST_ENGINE, choices=list(forecast.ENGINES))
+    args = parser.parse_args()
+
+    entries = read_watchlist(args.watchlist)
+    started = time.perf_counter()
+    failed = 0
+    print(f"{'kind':<8} {'name':<40} {'rows':>8} {'sync s':>8} {'wars s':>8} {'forecast s':>10} {'total s':>8}  status")
+    with ProcessPoolExecutor(
+        max_workers=args.processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=forecast._load_engine,
+        initargs=(args.engine,),
+    ) as pool:
+        futures = {pool.submit(run, kind, key, args.engine): (kind, key) for kind, key in entries}
+        for future in as_completed(futures):
+            kind, key = futures[future]
+            status, rows, timings, seconds = future.result()
+            failed += status.startswith("failed")
+            print(f"{kind:<8} {key[:40]:<40} {rows:>8} {timings['sync']:>8.2f} {timings['edit_wars']:>8.2f} {timings['forecast']:>10.2f} {seconds:>8.2f}  {status}")
+
+    print(f"Precomputed {len(entries)} entries in {time.perf_counter() - started:.1f}s, {failed} failed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
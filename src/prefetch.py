@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src import api_client, config, helpers, metrics, store
+
+# Fetches the contributors and articles a rendered page links to before they
+# are clicked, so following a link finds them synced and cached. A few
+# low-priority threads do the work: their API requests wait for spare rate
+# limit tokens, links beyond PREFETCH_MAX_PENDING waiting ones are dropped and
+# links warmed in the last WARM_SECONDS are not fetched again.
+
+WARM_SECONDS = 300
+
+_executor = None
+_pending = set()
+_warmed = {}
+_lock = threading.Lock()
+
+def warm_contributor(username):
+    helpers.get_contributor_aggregates(username, helpers.get_last_contribution_revid(username))
+
+def warm_article(article_key):
+    # The forecast is left to the page, fitting it here would take the
+    # forecast workers from pages that are open
+    last_revid = helpers.get_last_revid(article_key)
+    if helpers.get_article_aggregates(article_key, last_revid) is not None:
+        helpers.get_edit_wars(article_key, last_revid)
+
+WARMERS = {
+    "contributor": warm_contributor,
+    "article": warm_article,
+}
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=config.PREFETCH_WORKERS,
+            thread_name_prefix="prefetch",
+            initializer=api_client.set_background,
+            initargs=(True,),
+        )
+    return _executor
+
+def _run(kind, key):
+    try:
+        WARMERS[kind](key)
+        metrics.inc("prefetch_total", outcome="done")
+    except Exception as e:
+        print(f"Error prefetching {kind} {key}: {e}")
+        metrics.inc("prefetch_total", outcome="error")
+    finally:
+        with _lock:
+            _pending.discard((kind, key))
+            _warmed[(kind, key)] = time.monotonic()
+
+def queue(kind, names):
+    if config.PREFETCH_WORKERS <= 0:
+        return
+    now = time.monotonic()
+    for name in names:
+        key = (kind, store.page_key(name))
+        with _lock:
+            if len(_warmed) > config.PREFETCH_MAX_PENDING * 10:
+                for stale in [k for k, warmed in _warmed.items() if now - warmed >= WARM_SECONDS]:
+                    del _warmed[stale]
+            if key in _pending or now - _warmed.get(key, -WARM_SECONDS) < WARM_SECONDS:
+                continue
+            if len(_pending) >= config.PREFETCH_MAX_PENDING:
+                metrics.inc("prefetch_total", outcome="dropped")
+                continue
+            _pending.add(key)
+        metrics.inc("prefetch_total", outcome="queued")
+        _get_executor().submit(_run, *key)
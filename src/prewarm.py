@@ -0,0 +1,24 @@
+import threading
+import time
+from src import api_client, config, forecast, store
+
+# Work a fresh worker process would otherwise do while answering its first
+# requests: importing and initializing Plotly, starting the forecast process
+# pool, creating the store schema and opening the API session.
+
+def prewarm():
+    started = time.perf_counter()
+    import plotly.express as px
+    from dash._utils import to_json
+
+    # The first figure built loads Plotly's property validators
+    to_json(px.line(x=[0, 1], y=[0, 1]))
+    with store.connect():
+        pass
+    api_client.get_session()
+    if config.FORECAST_ENGINE not in forecast.INLINE_ENGINES:
+        forecast.start_workers()
+    print(f"Prewarmed in {time.perf_counter() - started:.2f}s")
+
+def start():
+    threading.Thread(target=prewarm, name="prewarm", daemon=True).start()
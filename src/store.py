@@ -0,0 +1,365 @@
+import os
+import json
+import sqlite3
+import numpy as np
+from contextlib import contextmanager
+from src import config, frames, metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS revisions (
+    page TEXT NOT NULL,
+    revid INTEGER NOT NULL,
+    parentid INTEGER,
+    timestamp INTEGER NOT NULL,
+    user TEXT,
+    sha1 TEXT,
+    size INTEGER,
+    PRIMARY KEY (page, revid)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS contributions (
+    username TEXT NOT NULL,
+    revid INTEGER NOT NULL,
+    parentid INTEGER,
+    pageid INTEGER,
+    title TEXT,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (username, revid)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS forecasts (
+    page TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    month TEXT NOT NULL,
+    params TEXT NOT NULL,
+    predictions TEXT NOT NULL,
+    PRIMARY KEY (page, engine)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS edit_wars (
+    page TEXT PRIMARY KEY,
+    revid INTEGER NOT NULL,
+    result TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    last_timestamp TEXT NOT NULL,
+    last_revid INTEGER,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+"""
+
+# Per-article and per-user aggregate index, kept up to date as rows are ingested.
+# Each table maps (key, bucket) -> edits, with the bucket computed by the SQL
+# expression from the ingested row.
+AGGREGATES = {
+    "revisions": {
+        "article_daily": "timestamp / 86400",
+        "article_hourly": "(timestamp / 3600) % 24",
+        "article_editors": "user",
+    },
+    "contributions": {
+        "contributor_daily": "timestamp / 86400",
+        "contributor_hourly": "(timestamp / 3600) % 24",
+        "contributor_articles": "title",
+    },
+}
+
+SCHEMA += "".join(
+    f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    key TEXT NOT NULL,
+    bucket NOT NULL,
+    edits INTEGER NOT NULL,
+    PRIMARY KEY (key, bucket)
+) WITHOUT ROWID;
+"""
+    for tables in AGGREGATES.values()
+    for table in tables
+)
+
+# Base table, its key column and the columns copied from the incoming rows.
+# Contributions are only counted into the index now, their table holds the rows
+# of older stores, which are indexed on first read.
+TABLES = {
+    "revisions": ("revisions", "page", ["revid", "parentid", "timestamp", "user", "sha1", "size"]),
+    "contributions": ("contributions", "username", ["revid", "parentid", "pageid", "title", "timestamp"]),
+}
+
+# Columns added to a table after stores were already created with it. Rows
+# stored before get them filled in when they are crawled again.
+ADDED_COLUMNS = {
+    "revisions": {"sha1": "TEXT", "size": "INTEGER"},
+}
+
+LOAD_CHUNK_SIZE = 50000
+
+_initialized = set()
+
+@contextmanager
+def connect():
+    path = config.STORE_PATH
+    if path not in _initialized:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        if path not in _initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            _migrate(conn)
+            _initialized.add(path)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def _migrate(conn):
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for table, added in ADDED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            missing = [column for column in added if column not in existing]
+            for column in missing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {added[column]}")
+            if missing:
+                # Forgetting the sync state makes the next sync crawl the whole
+                # history again, which backfills the new columns
+                conn.execute("DELETE FROM sync_state WHERE kind = ?", (table,))
+
+def page_key(article_name):
+    # The API treats underscores and spaces in titles the same way
+    return article_name.replace("_", " ").strip()
+
+def get_sync_state(kind, key):
+    with connect() as conn:
+        row = conn.execute(
+            "SELECT last_timestamp, last_revid FROM sync_state WHERE kind = ? AND key = ?",
+            (kind, key),
+        ).fetchone()
+    return row
+
+def get_sync_revids(kind, keys=None):
+    # {key: last stored revid}, for the given keys or everything of the kind
+    with connect() as conn:
+        if keys is None:
+            rows = conn.execute("SELECT key, last_revid FROM sync_state WHERE kind = ?", (kind,)).fetchall()
+        else:
+            keys = list(keys)
+            rows = conn.execute(
+                f"SELECT key, last_revid FROM sync_state WHERE kind = ? AND key IN ({', '.join('?' * len(keys))})",
+                (kind, *keys),
+            ).fetchall()
+    return dict(rows)
+
+def _update_sync_state(conn, kind, key, rows):
+    latest = max(rows, key=lambda row: (row["timestamp"], row["revid"]))
+    conn.execute(
+        """
+        INSERT INTO sync_state (kind, key, last_timestamp, last_revid) VALUES (?, ?, ?, ?)
+        ON CONFLICT (kind, key) DO UPDATE SET
+            last_timestamp = excluded.last_timestamp,
+            last_revid = excluded.last_revid
+        WHERE excluded.last_timestamp >= sync_state.last_timestamp
+        """,
+        (kind, key, latest["timestamp"], latest["revid"]),
+    )
+
+def _save_rows(conn, kind, key, rows):
+    # rows are (revid, parentid, pageid, title, user, timestamp, sha1, size) tuples.
+    # Only rows that are not stored yet are inserted and added to the aggregate
+    # index, stored rows only get the columns they are missing.
+    table, key_column, columns = TABLES[kind]
+    # Take the write lock up front: a transaction that reads first cannot be
+    # upgraded once another connection has written, and fails without waiting
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS incoming (
+            revid INTEGER PRIMARY KEY, parentid INTEGER, pageid INTEGER, title TEXT, user TEXT, timestamp INTEGER,
+            sha1 TEXT, size INTEGER
+        )
+        """
+    )
+    conn.execute("DELETE FROM incoming")
+    conn.executemany("INSERT OR IGNORE INTO incoming VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    for column in ADDED_COLUMNS.get(kind, {}):
+        conn.execute(
+            f"""
+            UPDATE {table} SET {column} = (SELECT {column} FROM incoming WHERE incoming.revid = {table}.revid)
+            WHERE {key_column} = ? AND revid IN (SELECT revid FROM incoming) AND {column} IS NULL
+            """,
+            (key,),
+        )
+    conn.execute(
+        f"DELETE FROM incoming WHERE EXISTS (SELECT 1 FROM {table} WHERE {key_column} = ? AND revid = incoming.revid)",
+        (key,),
+    )
+    inserted = conn.execute("SELECT COUNT(*) FROM incoming").fetchone()[0]
+    if not inserted:
+        return 0
+
+    conn.execute(
+        f"INSERT INTO {table} ({key_column}, {', '.join(columns)}) SELECT ?, {', '.join(columns)} FROM incoming",
+        (key,),
+    )
+    _add_to_aggregates(conn, kind, key, "incoming", "1")
+    return inserted
+
+def _add_to_aggregates(conn, kind, key, source, condition, params=()):
+    for aggregate, bucket in AGGREGATES[kind].items():
+        # "WHERE" before ON CONFLICT is required to keep the upsert unambiguous
+        conn.execute(
+            f"""
+            INSERT INTO {aggregate} (key, bucket, edits)
+            SELECT ?, {bucket}, COUNT(*) FROM {source} WHERE {condition} AND {bucket} IS NOT NULL GROUP BY 2
+            ON CONFLICT (key, bucket) DO UPDATE SET edits = edits + excluded.edits
+            """,
+            (key, *params),
+        )
+
+def rebuild_aggregates(kind, key):
+    table, key_column, _ = TABLES[kind]
+    with connect() as conn:
+        for aggregate in AGGREGATES[kind]:
+            conn.execute(f"DELETE FROM {aggregate} WHERE key = ?", (key,))
+        _add_to_aggregates(conn, kind, key, table, f"{key_column} = ?", (key,))
+
+@metrics.timed("store_save_revisions")
+def save_revisions(page, revisions):
+    if not revisions:
+        return 0
+    timestamps = frames.parse_timestamps([rev["timestamp"] for rev in revisions])
+    with connect() as conn:
+        inserted = _save_rows(conn, "revisions", page, [
+            (rev["revid"], rev.get("parentid"), None, None, rev.get("user"), int(timestamp), rev.get("sha1"), rev.get("size"))
+            for rev, timestamp in zip(revisions, timestamps)
+        ])
+        _update_sync_state(conn, "revisions", page, revisions)
+    return inserted
+
+def _load_frame(query, params, dtypes):
+    # Rows are turned into typed column chunks as they are read, so the full
+    # history never exists as a list of Python tuples
+    chunks = []
+    with connect() as conn:
+        cursor = conn.execute(query, params)
+        while rows := cursor.fetchmany(LOAD_CHUNK_SIZE):
+            chunks.append(frames.tuple_columns(rows, dtypes))
+    return frames.build_frame(chunks, dtypes)
+
+@metrics.timed("store_load_revisions")
+def load_revisions(page):
+    return _load_frame(
+        f"SELECT {', '.join(frames.REVISION_DTYPES)} FROM revisions WHERE page = ? ORDER BY revid DESC",
+        (page,),
+        frames.REVISION_DTYPES,
+    )
+
+@metrics.timed("store_load_revert_history")
+def load_revert_history(page):
+    # Oldest first, the order reverts are detected in
+    return _load_frame(
+        f"SELECT {', '.join(frames.REVERT_DTYPES)} FROM revisions WHERE page = ? ORDER BY revid",
+        (page,),
+        frames.REVERT_DTYPES,
+    )
+
+@metrics.timed("store_load_revision_window")
+def load_revision_window(page, start=None, end=None):
+    # Revisions between two epoch seconds, both inclusive, oldest first
+    return _load_frame(
+        f"SELECT {', '.join(frames.WINDOW_DTYPES)} FROM revisions WHERE page = ? AND timestamp BETWEEN ? AND ? ORDER BY revid",
+        (page, start if start is not None else -2**62, end if end is not None else 2**62),
+        frames.WINDOW_DTYPES,
+    )
+
+@metrics.timed("store_add_contribution_counts")
+def add_contribution_counts(username, counts, cursor, latest):
+    # Adds {aggregate table: {bucket: edits}} to the user's index without
+    # storing the contributions themselves. The counts are only added while
+    # the sync state is still at cursor, the (last_timestamp, last_revid) they
+    # were counted after, so a user synced by two processes is counted once.
+    with connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        sync_state = conn.execute(
+            "SELECT last_timestamp, last_revid FROM sync_state WHERE kind = 'contributions' AND key = ?",
+            (username,),
+        ).fetchone()
+        if sync_state != cursor:
+            return False
+        for aggregate, buckets in counts.items():
+            conn.executemany(
+                f"""
+                INSERT INTO {aggregate} (key, bucket, edits) VALUES (?, ?, ?)
+                ON CONFLICT (key, bucket) DO UPDATE SET edits = edits + excluded.edits
+                """,
+                [(username, bucket, edits) for bucket, edits in buckets.items()],
+            )
+        _update_sync_state(conn, "contributions", username, [latest])
+    return True
+
+def save_forecast(page, engine, month, params, predictions):
+    with connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO forecasts (page, engine, month, params, predictions) VALUES (?, ?, ?, ?, ?)",
+            (page, engine, month, json.dumps(params), json.dumps(predictions)),
+        )
+
+def load_forecast(page, engine):
+    with connect() as conn:
+        row = conn.execute(
+            "SELECT month, params, predictions FROM forecasts WHERE page = ? AND engine = ?",
+            (page, engine),
+        ).fetchone()
+    if row is None:
+        return None
+    return {"month": row[0], "params": json.loads(row[1]), "predictions": json.loads(row[2])}
+
+def save_edit_wars(page, revid, result):
+    with connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO edit_wars (page, revid, result) VALUES (?, ?, ?)",
+            (page, revid, json.dumps(result)),
+        )
+
+def load_edit_wars(page, revid):
+    # The result saved for the page, if it was detected at that revision
+    with connect() as conn:
+        row = conn.execute("SELECT revid, result FROM edit_wars WHERE page = ?", (page,)).fetchone()
+    if row is None or row[0] != revid:
+        return None
+    return json.loads(row[1])
+
+def load_daily(kind, key, start_day=None, end_day=None):
+    # Days since the epoch, both ends inclusive
+    table = next(iter(AGGREGATES[kind]))
+    with connect() as conn:
+        return conn.execute(
+            f"SELECT bucket, edits FROM {table} WHERE key = ? AND bucket BETWEEN ? AND ? ORDER BY bucket",
+            (key, start_day if start_day is not None else -2**62, end_day if end_day is not None else 2**62),
+        ).fetchall()
+
+@metrics.timed("store_load_editor_counts")
+def load_editor_counts(pages):
+    # (page, user, edits) for every editor of the given articles
+    pages = list(pages)
+    dtypes = {"page": "category", "user": "category", "edits": np.int64}
+    return _load_frame(
+        f"SELECT key, bucket, edits FROM article_editors WHERE key IN ({', '.join('?' * len(pages))})",
+        pages,
+        dtypes,
+    )
+
+def load_aggregates(kind, key, top=10):
+    aggregates = list(AGGREGATES[kind])
+    with connect() as conn:
+        daily = conn.execute(f"SELECT bucket, edits FROM {aggregates[0]} WHERE key = ? ORDER BY bucket", (key,)).fetchall()
+        hourly = conn.execute(f"SELECT bucket, edits FROM {aggregates[1]} WHERE key = ?", (key,)).fetchall()
+        distinct = conn.execute(f"SELECT COUNT(*) FROM {aggregates[2]} WHERE key = ?", (key,)).fetchone()[0]
+        top_counts = conn.execute(
+            f"SELECT bucket, edits FROM {aggregates[2]} WHERE key = ? ORDER BY edits DESC, bucket LIMIT ?",
+            (key, top),
+        ).fetchall()
+    return {"daily": daily, "hourly": hourly, "distinct": distinct, "top": top_counts}
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from src import config, helpers, metrics
+
+# Server-side history fetches that the detail pages poll while they render
+# partial results from whatever has been stored so far.
+
+SYNCERS = {
+    "revisions": helpers.sync_revisions,
+    "contributions": helpers.sync_contributions,
+}
+
+# Finished jobs are kept so that pages polling them see how they ended
+MAX_FINISHED_JOBS = 256
+
+_executor = None
+_jobs = OrderedDict()
+_lock = threading.Lock()
+
+class SyncJob:
+    def __init__(self, kind, key):
+        self.kind = kind
+        self.key = key
+        self.rows = 0
+        self.pages = 0
+        self.started = time.monotonic()
+        self.first_paint = None
+        self.error = None
+        self.future = None
+
+    def add_page(self, rows):
+        self.rows += rows
+        self.pages += 1
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def record_first_paint(self):
+        if self.first_paint is None:
+            self.first_paint = time.monotonic() - self.started
+            record_first_paint(self.first_paint)
+
+def record_first_paint(seconds):
+    # Seconds from the start of a page load until it first showed real data
+    metrics.observe("first_paint_seconds", seconds)
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=config.SYNC_WORKERS, thread_name_prefix="sync")
+    return _executor
+
+def _run(job, last_revid):
+    try:
+        SYNCERS[job.kind](job.key, last_revid, on_page=job.add_page)
+    except Exception as e:
+        print(f"Error syncing {job.kind} for {job.key}: {e}")
+        job.error = str(e)
+
+def start(kind, key, last_revid):
+    # One running fetch per entity, later page loads attach to it
+    with _lock:
+        job = _jobs.get((kind, key))
+        if job is None or job.done():
+            job = SyncJob(kind, key)
+            job.future = _get_executor().submit(_run, job, last_revid)
+            _jobs.pop((kind, key), None)
+            _jobs[(kind, key)] = job
+            _evict_finished()
+        return job
+
+def get(kind, key):
+    with _lock:
+        return _jobs.get((kind, key))
+
+def _evict_finished():
+    finished = [key for key, job in _jobs.items() if job.done()]
+    for key in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[key]
+
+def progress(first_edit, loaded_until):
+    # Histories are fetched oldest first, so the share of the time span between
+    # the first edit and now that is already loaded approximates progress
+    now = datetime.now(timezone.utc)
+    first_edit = first_edit.tz_localize("UTC") if first_edit.tzinfo is None else first_edit
+    total = (now - first_edit).total_seconds()
+    if total <= 0:
+        return 100
+    return max(0, min(100, round(100 * (loaded_until - first_edit).total_seconds() / total)))
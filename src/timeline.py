@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+from src import aggregates, config, store
+
+# Timelines are sent with at most TIMELINE_MAX_POINTS points: the quietest and
+# busiest day of each of max_points / 2 equal time buckets, so spikes survive
+# the downsampling. Zooming in re-queries the daily index for the visible range.
+
+def downsample(daily_count, max_points=None):
+    max_points = max_points or config.TIMELINE_MAX_POINTS
+    if len(daily_count) <= max_points:
+        return daily_count
+
+    days = pd.to_datetime(daily_count["timestamp"]).to_numpy(dtype="datetime64[D]").astype(np.int64)
+    buckets = max(max_points // 2, 1)
+    bucket = (days - days[0]) * buckets // (days[-1] - days[0] + 1)
+    grouped = pd.Series(daily_count["count"].to_numpy()).groupby(bucket)
+    keep = np.union1d(grouped.idxmin().to_numpy(), grouped.idxmax().to_numpy())
+    return daily_count.iloc[keep]
+
+def zoom_range(relayout_data):
+    # None when the x axis did not change, (None, None) when it was reset
+    if not relayout_data:
+        return None
+    if relayout_data.get("xaxis.autorange"):
+        return None, None
+    if "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
+        start, end = relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]
+    elif "xaxis.range" in relayout_data:
+        start, end = relayout_data["xaxis.range"]
+    else:
+        return None
+    return pd.Timestamp(start), pd.Timestamp(end)
+
+def load_window(kind, key, start=None, end=None):
+    start_day = end_day = None
+    if start is not None and end is not None:
+        # Half a window either side, so short pans still have points to show
+        pad = (end - start) / 2
+        start_day = (start - pad).floor("D").value // (86400 * 10**9)
+        end_day = (end + pad).ceil("D").value // (86400 * 10**9)
+    return aggregates.daily_count(store.load_daily(kind, key, start_day, end_day))
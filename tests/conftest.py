@@ -0,0 +1,7 @@
+import pytest
+from src import config
+
+@pytest.fixture
+def temp_store(tmp_path, monkeypatch):
+    # A fresh store per test, created on first connect
+    monkeypatch.setattr(config, "STORE_PATH", str(tmp_path / "store.sqlite3"))
@@ -0,0 +1,36 @@
+from src import aggregates, store
+
+def contribution(revid, timestamp, title="Earth"):
+    return {"revid": revid, "timestamp": timestamp, "title": title}
+
+def test_skips_contributions_up_to_cursor():
+    # The API resumes from the cursor's second, so it returns 100 and 99 again
+    counts = aggregates.ContributionCounts("Alice", ("2024-01-01T00:00:05Z", 100))
+    added = counts.add([
+        contribution(99, "2024-01-01T00:00:05Z"),
+        contribution(100, "2024-01-01T00:00:05Z"),
+        contribution(101, "2024-01-01T00:00:05Z"),
+        contribution(98, "2024-01-02T00:00:00Z", "Moon"),
+    ])
+    assert added == 2
+    assert counts.latest["revid"] == 98
+    index = counts.index()
+    assert index["daily"] == [(19723, 1), (19724, 1)]
+    assert index["distinct"] == 2
+
+def test_flush_counts_once(temp_store):
+    first = aggregates.ContributionCounts("Alice", None)
+    first.add([contribution(1, "2024-01-01T00:00:00Z"), contribution(2, "2024-01-01T01:00:00Z")])
+    assert first.flush()
+    assert first.cursor == ("2024-01-01T01:00:00Z", 2)
+
+    # A second sync that started from the same empty state lost the race
+    second = aggregates.ContributionCounts("Alice", None)
+    second.add([contribution(1, "2024-01-01T00:00:00Z")])
+    assert not second.flush()
+
+    # Later pages continue from the cursor without counting it again
+    first.add([contribution(2, "2024-01-01T01:00:00Z"), contribution(3, "2024-01-01T02:00:00Z")])
+    assert first.flush()
+    assert store.load_aggregates("contributions", "Alice")["daily"] == [(19723, 3)]
+    assert store.get_sync_state("contributions", "Alice") == ("2024-01-01T02:00:00Z", 3)
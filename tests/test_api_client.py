@@ -0,0 +1,125 @@
+import json
+import threading
+import pytest
+import requests
+from src import api_client, config
+
+def response(status, body=None, headers=None):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = json.dumps(body or {}).encode()
+    resp.headers.update(headers or {})
+    return resp
+
+class Session:
+    # Answers every request with the next scripted response
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+@pytest.fixture
+def api(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(api_client, "rate_limiter", api_client.TokenBucket(0, 1))
+    monkeypatch.setattr(api_client.time, "sleep", sleeps.append)
+    monkeypatch.setattr(config, "API_MAX_RETRIES", 2)
+
+    def serve(*responses):
+        session = Session(responses)
+        monkeypatch.setattr(api_client, "get_session", lambda: session)
+        return session
+    serve.sleeps = sleeps
+    return serve
+
+@pytest.fixture
+def joins(monkeypatch):
+    # Released once for every caller that joins a running flight
+    joined = threading.Semaphore(0)
+    inc = api_client.metrics.inc
+
+    def count_joins(name, *args, **labels):
+        if name == "api_coalesced_total":
+            joined.release()
+        inc(name, *args, **labels)
+    monkeypatch.setattr(api_client.metrics, "inc", count_joins)
+    return joined
+
+def run_flight(key, fetch, joins, callers):
+    # The leader's fetch finishes only once every other caller joined it
+    started, release = threading.Event(), threading.Event()
+    outcomes = []
+
+    def leading():
+        started.set()
+        release.wait()
+        return fetch()
+
+    def call():
+        try:
+            outcomes.append(api_client.single_flight(key, leading))
+        except api_client.APIError as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for _ in threads[1:]:
+        joins.acquire()
+    release.set()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+def test_joiners_share_one_flight(joins):
+    calls = []
+    outcomes = run_flight(("test", 1), lambda: calls.append(1) or "result", joins, 4)
+    assert len(calls) == 1
+    assert outcomes == ["result"] * 4
+    assert ("test", 1) not in api_client._in_flight
+
+def test_leader_exception_reaches_joiners(joins):
+    error = api_client.APIError("upstream down")
+
+    def fetch():
+        raise error
+    assert run_flight(("test", 2), fetch, joins, 3) == [error] * 3
+    assert ("test", 2) not in api_client._in_flight
+
+def test_retry_after_is_clamped(api, monkeypatch):
+    monkeypatch.setattr(config, "API_MAX_RETRY_AFTER", 30.0)
+    session = api(response(503, headers={"Retry-After": "86400"}), response(200, {"query": {}}))
+    assert api_client._request({"action": "query"}, "query") == {"query": {}}
+    assert session.calls == 2
+    assert api.sleeps == [30.0]
+
+def test_maxlag_is_retried(api):
+    lagging = response(200, {"error": {"code": "maxlag", "info": "Waiting for a replica"}})
+    session = api(lagging, response(200, {"query": {"pages": []}}))
+    assert api_client._request({"action": "query"}, "query") == {"query": {"pages": []}}
+    assert session.calls == 2
+    assert api.sleeps == [config.API_MAXLAG]
+
+def test_gives_up_after_max_retries(api):
+    session = api(*[response(502)] * 3)
+    with pytest.raises(api_client.APIError, match="after 3 attempts"):
+        api_client._request({"action": "query"}, "query")
+    assert session.calls == 3
+
+def test_client_errors_are_not_retried(api):
+    session = api(response(404), response(200))
+    with pytest.raises(api_client.APIError):
+        api_client._request({"action": "query"}, "query")
+    assert session.calls == 1
+    assert api.sleeps == []
+
+def test_api_errors_are_not_retried(api):
+    session = api(response(200, {"error": {"code": "badtitle", "info": "Bad title"}}), response(200))
+    with pytest.raises(api_client.APIError, match="badtitle"):
+        api_client._request({"action": "query"}, "query")
+    assert session.calls == 1
@@ -0,0 +1,24 @@
+from src import co_editors, store
+
+def save(page, users):
+    store.save_revisions(page, [
+        {"revid": revid, "parentid": revid - 1, "user": user, "timestamp": f"2024-01-01T00:00:{revid:02d}Z"}
+        for revid, user in enumerate(users, start=1)
+    ])
+
+def test_overlap(temp_store):
+    save("Earth", ["Alice", "Bob", "Alice"])
+    save("Moon", ["Bob", "Carol"])
+    result = co_editors.overlap(["Earth", "Moon"])
+    assert result["editors"].tolist() == [2, 2]
+    assert result["shared"].tolist() == [[2, 1], [1, 2]]
+    assert result["jaccard"][0, 1] == 1 / 3
+    assert result["top_editors"]["Editor"].tolist() == ["Bob"]
+
+def test_overlap_repeated_key(temp_store):
+    # Two compared names of one page, e.g. "Earth_moon" and "Earth moon"
+    save("Earth moon", ["Alice", "Bob"])
+    save("Mars", ["Bob"])
+    result = co_editors.overlap(["Earth moon", "Earth moon", "Mars"])
+    assert result["articles"] == ["Earth moon", "Mars"]
+    assert result["shared"].tolist() == [[2, 1], [1, 1]]
@@ -0,0 +1,64 @@
+import io
+from src import dump_ingest
+
+DUMP = b"""<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/" version="0.11">
+  <siteinfo><sitename>Wikipedia</sitename></siteinfo>
+  <page>
+    <title>Earth</title>
+    <ns>0</ns>
+    <id>7</id>
+    <revision>
+      <id>1</id>
+      <timestamp>2024-01-01T00:00:00Z</timestamp>
+      <contributor><username>Alice</username><id>3</id></contributor>
+      <text bytes="120" id="1" />
+      <sha1>z</sha1>
+    </revision>
+    <revision>
+      <id>2</id>
+      <parentid>1</parentid>
+      <timestamp>2024-01-02T00:00:00Z</timestamp>
+      <contributor><ip>192.0.2.1</ip></contributor>
+      <text bytes="80" id="2" />
+      <sha1>10</sha1>
+    </revision>
+    <revision>
+      <id>3</id>
+      <parentid>2</parentid>
+      <timestamp>2024-01-03T00:00:00Z</timestamp>
+      <contributor deleted="deleted" />
+      <text bytes="90" id="3" />
+      <sha1 />
+    </revision>
+  </page>
+  <page>
+    <title>Talk:Earth</title>
+    <ns>1</ns>
+    <id>8</id>
+    <revision>
+      <id>4</id>
+      <timestamp>2024-01-01T00:00:00Z</timestamp>
+      <contributor><username>Bob</username><id>4</id></contributor>
+      <sha1>1</sha1>
+    </revision>
+  </page>
+</mediawiki>
+"""
+
+def test_iter_pages():
+    pages = list(dump_ingest.iter_pages(io.BytesIO(DUMP)))
+    assert [(pageid, title) for pageid, title, _ in pages] == [(7, "Earth")]
+    assert pages[0][2] == [
+        {"revid": 1, "parentid": None, "user": "Alice", "timestamp": "2024-01-01T00:00:00Z", "sha1": f"{35:040x}", "size": 120},
+        {"revid": 2, "parentid": 1, "user": "192.0.2.1", "timestamp": "2024-01-02T00:00:00Z", "sha1": f"{36:040x}", "size": 80},
+        {"revid": 3, "parentid": 2, "user": None, "timestamp": "2024-01-03T00:00:00Z", "sha1": None, "size": 90},
+    ]
+
+def test_iter_pages_batches(monkeypatch):
+    monkeypatch.setattr(dump_ingest, "BATCH_SIZE", 2)
+    pages = list(dump_ingest.iter_pages(io.BytesIO(DUMP), namespaces=(0, 1)))
+    assert [(title, [rev["revid"] for rev in revisions]) for _, title, revisions in pages] == [
+        ("Earth", [1, 2]),
+        ("Earth", [3]),
+        ("Talk:Earth", [4]),
+    ]
@@ -0,0 +1,79 @@
+import json
+import numpy as np
+import pandas as pd
+from src import edit_wars, frames
+
+DAY = 86400
+
+def history(edits):
+    # A revert history frame from (user, content, day) edits, oldest first
+    rows = [
+        {
+            "user": user,
+            "timestamp": pd.Timestamp(day * DAY, unit="s").strftime("%Y-%m-%dT%H:%M:%SZ"),
+            # Only the first 15 hex digits are kept
+            "sha1": f"{content:015x}".ljust(40, "0"),
+        }
+        for user, content, day in edits
+    ]
+    return frames.build_frame([frames.page_columns(rows, frames.REVERT_DTYPES)], frames.REVERT_DTYPES)
+
+def test_find_reverts():
+    # 2 restores 0, 4 repeats its parent and the hidden hashes never match
+    reverts, restored = edit_wars.find_reverts(np.array([10, 20, 10, 30, 30, -1, -1]))
+    assert reverts.tolist() == [2]
+    assert restored.tolist() == [0]
+
+def test_find_reverts_beyond_radius():
+    hashes = np.array([1] + list(range(100, 100 + edit_wars.REVERT_RADIUS + 1)) + [1])
+    reverts, _ = edit_wars.find_reverts(hashes)
+    assert reverts.tolist() == []
+
+def test_mutual_reverts():
+    # Alice reverts Bob, Bob reverts her back a day later, then Alice again
+    # eight days after that
+    users = np.array([0, 1, 0, 1, 0])
+    reverts, restored = np.array([2, 3, 4]), np.array([0, 1, 2])
+    seconds = np.array([0, 0, 1, 2, 10]) * DAY
+    events = edit_wars.revert_events(users, reverts, restored)
+    assert events[["reverter", "reverted"]].values.tolist() == [[0, 1], [1, 0], [0, 1]]
+
+    pair, mutual = edit_wars.mutual_reverts(events, seconds)
+    assert len(set(pair.tolist())) == 1
+    assert mutual.tolist() == [False, True, False]
+
+def test_revert_chains():
+    # 3 undoes the revert at 2, 6 starts a new chain
+    chains = edit_wars.revert_chains(np.array([2, 3, 6]), np.array([0, 1, 4]))
+    assert chains.tolist() == [2, 1]
+
+def test_detect_editor_pair():
+    result = edit_wars.detect(history([
+        ("Bob", 1, 0),
+        ("Alice", 2, 1),
+        ("Bob", 1, 1),
+        ("Alice", 2, 2),
+        ("Bob", 1, 3),
+        ("Carol", 3, 30),
+    ]))
+    assert result["reverts"] == 3
+    assert result["mutual_reverts"] == 2
+    assert result["longest_chain"] == 3
+    pairs = result["warring_pairs"]
+    assert pairs[["Editor", "Opponent", "Mutual Reverts"]].values.tolist() == [["Alice", "Bob", 2]]
+    assert pairs["Last Clash"].tolist() == ["1970-01-04"]
+
+def test_detect_without_reverts():
+    result = edit_wars.detect(history([("Alice", 1, 0), ("Bob", 2, 1)]))
+    assert result["reverts"] == 0
+    assert result["controversy"] == 0
+    assert result["warring_pairs"].empty
+
+def test_record_round_trip():
+    result = edit_wars.detect(history([("Bob", 1, 0), ("Alice", 2, 1), ("Bob", 1, 1), ("Alice", 2, 2)]))
+    saved = edit_wars.from_record(json.loads(json.dumps(edit_wars.to_record(result))))
+    assert {key: saved[key] for key in ["reverts", "mutual_reverts", "controversy", "longest_chain"]} == {
+        key: result[key] for key in ["reverts", "mutual_reverts", "controversy", "longest_chain"]
+    }
+    pd.testing.assert_frame_equal(saved["warring_pairs"], result["warring_pairs"])
+    pd.testing.assert_frame_equal(saved["intensity"], result["intensity"])
@@ -0,0 +1,85 @@
+import pytest
+from src import api_client, helpers, store
+
+def revision(revid, second, user="Alice", sha1=None):
+    return {
+        "revid": revid, "parentid": revid - 1, "user": user,
+        "timestamp": f"2024-01-01T00:00:{second:02d}Z", "sha1": sha1, "size": 10,
+    }
+
+HISTORY = [revision(revid, second) for revid, second in [(1, 0), (2, 1), (3, 1), (4, 2), (5, 3), (6, 4)]]
+
+def stored_revids(page):
+    return sorted(store.load_revisions(page)["revid"].tolist())
+
+class API:
+    # Serves HISTORY oldest first in pages of two, from rvstart inclusive like
+    # the real API, and fails on the page given
+    def __init__(self, fail_on_page=None):
+        self.fail_on_page = fail_on_page
+        self.requests = []
+
+    def iter_query(self, params):
+        self.requests.append(dict(params))
+        revisions = [rev for rev in HISTORY if rev["timestamp"] >= params.get("rvstart", "")]
+        for page, start in enumerate(range(0, len(revisions), 2)):
+            if page == self.fail_on_page:
+                raise api_client.APIError("connection reset")
+            yield {"query": {"pages": [{"revisions": revisions[start:start + 2]}]}}
+
+@pytest.fixture
+def api(monkeypatch):
+    def serve(fail_on_page=None):
+        fake = API(fail_on_page)
+        monkeypatch.setattr(api_client, "iter_query", fake.iter_query)
+        return fake
+    return serve
+
+def test_save_revisions_skips_stored_rows(temp_store):
+    assert store.save_revisions("Earth", HISTORY[:4]) == 4
+    assert store.save_revisions("Earth", HISTORY[2:]) == 2
+    assert stored_revids("Earth") == [1, 2, 3, 4, 5, 6]
+    # Overlapping batches are counted into the aggregate index once
+    assert store.load_aggregates("revisions", "Earth")["daily"] == [(19723, 6)]
+
+def test_save_revisions_fills_missing_columns(temp_store):
+    store.save_revisions("Earth", HISTORY[:2])
+    assert store.save_revisions("Earth", [revision(2, 1, sha1="ab" * 20)]) == 0
+    assert store.load_revert_history("Earth")["sha1"].tolist()[1] != -1
+    assert store.load_aggregates("revisions", "Earth")["daily"] == [(19723, 2)]
+
+def test_sync_state_never_moves_back(temp_store):
+    store.save_revisions("Earth", HISTORY[3:])
+    store.save_revisions("Earth", HISTORY[:2])
+    assert store.get_sync_state("revisions", "Earth") == ("2024-01-01T00:00:04Z", 6)
+
+def test_interrupted_sync_keeps_a_contiguous_prefix(temp_store, api):
+    fake = api(fail_on_page=2)
+    with pytest.raises(api_client.APIError):
+        helpers.sync_revisions("Earth", 6)
+    # Only the pages before the failure are stored, and the sync state is at
+    # their newest revision
+    assert stored_revids("Earth") == [1, 2, 3, 4]
+    assert store.get_sync_state("revisions", "Earth") == ("2024-01-01T00:00:02Z", 4)
+    assert "rvstart" not in fake.requests[0]
+
+def test_resumed_sync_continues_from_cursor(temp_store, api):
+    api(fail_on_page=2)
+    with pytest.raises(api_client.APIError):
+        helpers.sync_revisions("Earth", 6)
+
+    fake = api()
+    rows = []
+    helpers.sync_revisions("Earth", 6, on_page=rows.append)
+    assert fake.requests[0]["rvstart"] == "2024-01-01T00:00:02Z"
+    # The API repeats revision 4, from the cursor's second, it is stored once
+    assert sum(rows) == 3
+    assert stored_revids("Earth") == [1, 2, 3, 4, 5, 6]
+    assert store.get_sync_state("revisions", "Earth") == ("2024-01-01T00:00:04Z", 6)
+    assert store.load_aggregates("revisions", "Earth")["daily"] == [(19723, 6)]
+
+def test_synced_history_is_not_fetched(temp_store, api):
+    store.save_revisions("Earth", HISTORY)
+    fake = api()
+    helpers.sync_revisions("Earth", 6)
+    assert fake.requests == []